@@ -0,0 +1,257 @@
+# Connect 4 search benchmark
+# Runs the engine's search entry points over fixed, seeded sets of opening,
+# middlegame and endgame positions at several depths (the exact solver runs on the
+# endgame set only). Reports total nodes, nodes
+# per second, time to depth and the alpha-beta pruning ratio, writes the results as
+# JSON (with the engine's symmetry, threat and evaluation cache counters) and
+# compares them with a saved baseline to flag regressions.
+#
+#     python benchmark.py --output bench.json
+#     python benchmark.py --baseline bench.json
+#
+# With --geometries it instead measures how the cost per node changes with the board
+# size and line length (see geometry.py):
+#
+#     python benchmark.py --geometries 7x6 8x7 9x7 10x8 9x7x5
+
+import json
+import math
+import platform
+import random
+import sys
+import time
+
+import engine
+from engine import (AI_PIECE, PLAYER_PIECE, create_board, drop_piece, get_next_open_row, get_valid_locations,
+                    is_terminal_node, pick_best_move, solve, TranspositionTable, MoveOrdering)
+from geometry import parse_geometry
+from profiler import SearchProfiler
+
+# Number of pieces already on the board for the positions of each suite
+SUITES = {
+    "opening": (2, 8),
+    "middlegame": (12, 20),
+    "endgame": (26, 34),
+}
+
+
+# Play seeded random moves until a non-terminal position with the wanted number of
+# pieces is reached. Returns (board, maximizingPlayer) pairs.
+def make_suite(name, count, seed):
+    low, high = SUITES[name]
+    rng = random.Random(f"{seed}-{name}")
+    positions = []
+    while len(positions) < count:
+        board = create_board()
+        plies = rng.randint(low, high)
+        maximizingPlayer = rng.random() < 0.5
+        for _ in range(plies):
+            if is_terminal_node(board):
+                break
+            col = rng.choice(get_valid_locations(board))
+            drop_piece(board, get_next_open_row(board, col), col, AI_PIECE if maximizingPlayer else PLAYER_PIECE)
+            maximizingPlayer = not maximizingPlayer
+        if not is_terminal_node(board):
+            positions.append((board, maximizingPlayer))
+    return positions
+
+
+# Search one position with an entry point and return (nodes, seconds). The searches
+# are looked up on the engine module so a running SearchProfiler sees them.
+def run_search(algorithm, board, depth, maximizingPlayer):
+    start_time = time.perf_counter()
+    if algorithm == "minimax":
+        _, _, nodes, _ = engine.minimax(board, depth, maximizingPlayer)
+    elif algorithm == "alpha_beta":
+        # Fresh tables so every run searches the same tree
+        _, _, nodes, _ = engine.alpha_beta_ab(board, depth, -math.inf, math.inf, maximizingPlayer,
+                                              TranspositionTable(4), None, None, MoveOrdering())
+    elif algorithm == "solver":
+        nodes = solve(board, maximizingPlayer)["nodes"]
+    else:
+        pick_best_move(board, AI_PIECE if maximizingPlayer else PLAYER_PIECE)
+        nodes = len(get_valid_locations(board))
+    return nodes, time.perf_counter() - start_time
+
+
+# Algorithms that ignore the depth and run once per suite, and the suites they run on
+SINGLE_RUN = {"pick_best_move": tuple(SUITES), "solver": ("endgame",)}
+
+
+def run_benchmark(depths=(2, 4, 6), positions_per_suite=10, seed=1, minimax_max_depth=4,
+                  algorithms=("minimax", "alpha_beta", "pick_best_move", "solver")):
+    previous_book, engine.opening_book = engine.opening_book, None
+    random.seed(seed)
+    results = []
+    try:
+        for suite in SUITES:
+            positions = make_suite(suite, positions_per_suite, seed)
+            for algorithm in algorithms:
+                if algorithm in SINGLE_RUN and suite not in SINGLE_RUN[algorithm]:
+                    continue
+                for depth in (depths if algorithm not in SINGLE_RUN else (1,)):
+                    if algorithm == "minimax" and depth > minimax_max_depth:
+                        continue
+                    nodes = 0
+                    seconds = 0.0
+                    slowest = 0.0
+                    engine.symmetry_stats.reset_stats()
+                    engine.threat_stats.reset_stats()
+                    if engine.eval_cache is not None:
+                        engine.eval_cache.clear()
+                    for board, maximizingPlayer in positions:
+                        position_nodes, position_seconds = run_search(algorithm, board, depth, maximizingPlayer)
+                        nodes += position_nodes
+                        seconds += position_seconds
+                        slowest = max(slowest, position_seconds)
+                    results.append({"suite": suite, "algorithm": algorithm, "depth": depth,
+                                    "positions": len(positions), "nodes": nodes,
+                                    "time_ms": seconds * 1000, "max_time_ms": slowest * 1000,
+                                    "nodes_per_sec": nodes / seconds if seconds else None,
+                                    "symmetry": engine.symmetry_stats.stats(),
+                                    "threats": engine.threat_stats.stats(),
+                                    "eval_cache": engine.eval_cache.stats() if engine.eval_cache is not None else None})
+    finally:
+        engine.opening_book = previous_book
+
+    # Pruning ratio: alpha-beta nodes as a fraction of the full minimax tree
+    minimax_nodes = {(r["suite"], r["depth"]): r["nodes"] for r in results if r["algorithm"] == "minimax"}
+    for result in results:
+        full_tree = minimax_nodes.get((result["suite"], result["depth"]))
+        if result["algorithm"] == "alpha_beta" and full_tree:
+            result["pruning_ratio"] = result["nodes"] / full_tree
+
+    return {"meta": {"seed": seed, "positions_per_suite": positions_per_suite, "depths": list(depths),
+                     "python": platform.python_version(), "machine": platform.machine(),
+                     "date": time.strftime("%Y-%m-%dT%H:%M:%S")},
+            "results": results}
+
+
+# Cost per node of alpha-beta (and of minimax up to minimax_max_depth) on each board
+# geometry, over middlegame positions of that geometry
+def run_scaling(geometries, depth=6, positions_per_suite=10, seed=1, minimax_max_depth=4):
+    previous_geometry = engine.GEOMETRY
+    results = []
+    try:
+        for name in geometries:
+            geometry = engine.configure(parse_geometry(name))
+            random.seed(seed)
+            positions = make_suite("middlegame", positions_per_suite, seed)
+            for algorithm in ("minimax", "alpha_beta"):
+                if algorithm == "minimax" and depth > minimax_max_depth:
+                    continue
+                nodes = 0
+                seconds = 0.0
+                for board, maximizingPlayer in positions:
+                    position_nodes, position_seconds = run_search(algorithm, board, depth, maximizingPlayer)
+                    nodes += position_nodes
+                    seconds += position_seconds
+                results.append({"geometry": name, "rows": geometry.rows, "columns": geometry.columns,
+                                "connect": geometry.connect, "lines": len(geometry.lines), "algorithm": algorithm,
+                                "depth": depth, "positions": len(positions), "nodes": nodes,
+                                "time_ms": seconds * 1000, "us_per_node": seconds * 1e6 / nodes if nodes else None})
+    finally:
+        engine.configure(previous_geometry)
+    return {"meta": {"seed": seed, "positions_per_suite": positions_per_suite, "depth": depth,
+                     "python": platform.python_version(), "machine": platform.machine(),
+                     "date": time.strftime("%Y-%m-%dT%H:%M:%S")},
+            "scaling": results}
+
+
+# Compare a run with a baseline. Node counts are deterministic, so any change is
+# reported; a drop in nodes/sec beyond the tolerance is a regression.
+def compare(report, baseline, tolerance=0.2):
+    previous = {(r["suite"], r["algorithm"], r["depth"]): r for r in baseline["results"]}
+    regressions = []
+    notes = []
+    for result in report["results"]:
+        old = previous.get((result["suite"], result["algorithm"], result["depth"]))
+        if old is None:
+            continue
+        name = f"{result['suite']}/{result['algorithm']}/depth {result['depth']}"
+        if result["nodes"] > old["nodes"]:
+            regressions.append(f"{name}: nodes {old['nodes']} -> {result['nodes']}")
+        elif result["nodes"] < old["nodes"]:
+            notes.append(f"{name}: nodes {old['nodes']} -> {result['nodes']}")
+        if old.get("nodes_per_sec") and result["nodes_per_sec"] is not None:
+            change = result["nodes_per_sec"] / old["nodes_per_sec"] - 1
+            if change < -tolerance:
+                regressions.append(f"{name}: nodes/sec {old['nodes_per_sec']:.0f} -> "
+                                   f"{result['nodes_per_sec']:.0f} ({change:+.0%})")
+    return regressions, notes
+
+
+def print_scaling(report):
+    print(f"{'geometry':<9} {'lines':>5} {'algorithm':<11} {'depth':>5} {'nodes':>10} {'time ms':>10} {'us/node':>8}")
+    for r in report["scaling"]:
+        per_node = f"{r['us_per_node']:.1f}" if r["us_per_node"] is not None else "-"
+        print(f"{r['geometry']:<9} {r['lines']:>5} {r['algorithm']:<11} {r['depth']:>5} {r['nodes']:>10} "
+              f"{r['time_ms']:>10.1f} {per_node:>8}")
+
+
+def print_report(report):
+    print(f"{'suite':<11} {'algorithm':<15} {'depth':>5} {'nodes':>10} {'time ms':>10} {'nodes/s':>10} "
+          f"{'pruning':>8}")
+    for r in report["results"]:
+        nps = f"{r['nodes_per_sec']:.0f}" if r["nodes_per_sec"] else "-"
+        pruning = f"{r['pruning_ratio']:.3f}" if "pruning_ratio" in r else "-"
+        print(f"{r['suite']:<11} {r['algorithm']:<15} {r['depth']:>5} {r['nodes']:>10} {r['time_ms']:>10.1f} "
+              f"{nps:>10} {pruning:>8}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the Connect 4 search functions.")
+    parser.add_argument("--depths", type=int, nargs="+", default=[2, 4, 6], help="search depths")
+    parser.add_argument("--positions", type=int, default=10, help="positions per suite")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the position suites")
+    parser.add_argument("--minimax-max-depth", type=int, default=4, help="skip minimax above this depth")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with a JSON file from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed drop in nodes/sec")
+    parser.add_argument("--profile", help="profile the searches and write per-ply statistics to this JSON file")
+    parser.add_argument("--trace", help="profile the searches and write a Chrome trace to this file")
+    parser.add_argument("--geometries", nargs="+",
+                        help="measure the cost per node on these boards instead, e.g. 7x6 10x8 9x7x5")
+    args = parser.parse_args()
+
+    if args.geometries:
+        try:
+            for name in args.geometries:
+                parse_geometry(name)
+        except ValueError as error:
+            parser.error(str(error))
+        report = run_scaling(args.geometries, max(args.depths), args.positions, args.seed, args.minimax_max_depth)
+        print_scaling(report)
+        if args.output:
+            with open(args.output, "w") as output:
+                json.dump(report, output, indent=2)
+        sys.exit(0)
+
+    # Profiled runs are slower, so their nodes/sec should not be compared with a baseline
+    profiler = SearchProfiler() if args.profile or args.trace else None
+    if profiler is not None:
+        profiler.start()
+    try:
+        report = run_benchmark(args.depths, args.positions, args.seed, args.minimax_max_depth)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+    if args.profile:
+        profiler.write_json(args.profile)
+    if args.trace:
+        profiler.write_trace(args.trace)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions, notes = compare(report, json.load(baseline_file), args.tolerance)
+        for note in notes:
+            print(f"improved: {note}")
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
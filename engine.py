@@ -0,0 +1,1364 @@
+# Connect 4 engine
+# Board representation, evaluation and search, with no display code so it can be
+# imported, benchmarked and run on machines without a screen.
+
+import random
+import os
+import sys
+import json
+import time
+import math
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, FIRST_EXCEPTION, wait
+
+from geometry import Geometry
+
+# Pieces
+EMPTY = 0
+PLAYER_PIECE = 1
+AI_PIECE = 2
+
+# The standard game: 6 rows, 7 columns, four in a row
+DEFAULT_GEOMETRY = Geometry(6, 7, 4)
+
+
+# Set the module constants below from a Geometry. They always describe the current
+# board; configure() switches to another size or line length.
+def _use_geometry(geometry):
+    global GEOMETRY, ROW_COUNT, COLUMN_COUNT, WINDOW_LENGTH, COLUMN_HEIGHT, BOTTOM_MASK, TOP_MASK, BOARD_MASK
+    global COLUMN_BITS, LINE_SHIFTS, CELL_LINES, ZOBRIST_KEYS, ZOBRIST_MIN_TO_MOVE, ZOBRIST_MIRROR_KEYS
+    global WINDOW_STARTS, CENTER_MASK, CENTER_ORDER, BOARD_CELLS, GOOD_THREAT_ROWS
+    GEOMETRY = geometry
+
+    # Board dimensions and winning conditions
+    ROW_COUNT = geometry.rows
+    COLUMN_COUNT = geometry.columns
+    WINDOW_LENGTH = geometry.connect
+
+    # Bitboard layout (see geometry.py): bit (c * COLUMN_HEIGHT + r) is row r, column c
+    COLUMN_HEIGHT = geometry.column_height
+    BOTTOM_MASK = geometry.bottom_mask
+    TOP_MASK = geometry.top_mask
+    BOARD_MASK = geometry.board_mask
+    COLUMN_BITS = geometry.column_bits
+
+    # Shift distances for the four line directions: vertical, horizontal and both diagonals
+    LINE_SHIFTS = geometry.line_shifts
+
+    # Winning lines through each bit index, for checking only the last piece played
+    CELL_LINES = geometry.cell_lines
+
+    # Zobrist keys: one random 64-bit number per piece per bitboard cell, plus one for
+    # the side to move. A fixed seed keeps hashes stable between runs.
+    zobrist_rng = random.Random(20240601)
+    ZOBRIST_KEYS = [[zobrist_rng.getrandbits(64) for _ in range(geometry.bits)] for _ in range(3)]
+    ZOBRIST_MIN_TO_MOVE = zobrist_rng.getrandbits(64)
+
+    # The same keys for the left-right mirrored cell, so boards can keep the hash of
+    # their mirror image up to date as well
+    ZOBRIST_MIRROR_KEYS = [[keys[(COLUMN_COUNT - 1 - index // COLUMN_HEIGHT) * COLUMN_HEIGHT + index % COLUMN_HEIGHT]
+                            for index in range(geometry.bits)]
+                           for keys in ZOBRIST_KEYS]
+
+    # Window starts for each direction in LINE_SHIFTS: bit x is set when the
+    # WINDOW_LENGTH cells x, x + shift, x + 2 * shift, ... all lie on the board
+    WINDOW_STARTS = geometry.window_starts
+    CENTER_MASK = geometry.center_mask
+
+    # Columns from the center outwards, the usual static move order for Connect 4
+    CENTER_ORDER = geometry.center_order
+
+    # Number of cells, the length of the longest game
+    BOARD_CELLS = geometry.cells
+
+    # Rows where a threat is worth most, for the first and the second player: when
+    # the columns fill up, the first player gets the odd rows and the second player
+    # the even ones. This only holds when columns have an even number of rows.
+    if ROW_COUNT % 2 == 0:
+        GOOD_THREAT_ROWS = (geometry.odd_rows_mask, geometry.even_rows_mask)
+    else:
+        GOOD_THREAT_ROWS = (0, 0)
+
+
+_use_geometry(DEFAULT_GEOMETRY)
+
+# Switch the engine to another board size or line length, e.g.
+# configure(Geometry(rows=7, columns=9, connect=5)). Boards made before the switch
+# cannot be used after it. The shared tables are cleared, and the opening book, which
+# only covers the standard game, is unloaded.
+def configure(geometry=DEFAULT_GEOMETRY):
+    global opening_book, _search_pool
+    if geometry == GEOMETRY:
+        return GEOMETRY
+    _use_geometry(geometry)
+    transposition_table.clear()
+    move_ordering.clear()
+    symmetry_stats.reset_stats()
+    threat_stats.reset_stats()
+    if eval_cache is not None:
+        eval_cache.clear()
+    opening_book = None
+    if _search_pool is not None:
+        _search_pool.shutdown(cancel_futures=True)
+        _search_pool = None
+    return GEOMETRY
+
+
+# Game board stored as one occupancy bitmask per piece plus per-column heights
+class Board:
+    __slots__ = ("masks", "heights", "key", "mirror_key", "winner", "threats", "first", "undo")
+
+    def __init__(self):
+        self.masks = [0, 0, 0]  # indexed by piece, masks[EMPTY] is unused
+        self.heights = [0] * COLUMN_COUNT
+        self.key = 0  # Zobrist hash, updated incrementally by drop_piece/remove_piece
+        self.mirror_key = 0  # Zobrist hash of the mirrored board
+        self.winner = EMPTY  # piece that has a line, set by drop_piece
+        self.threats = [0, 0, 0]  # per piece, the empty cells that would complete a line
+        self.first = EMPTY  # piece that moved first
+        self.undo = []  # (player threats, AI threats, winner) before each drop, for remove_piece
+
+    def copy(self):
+        board = Board.__new__(Board)
+        board.masks = self.masks[:]
+        board.heights = self.heights[:]
+        board.key = self.key
+        board.mirror_key = self.mirror_key
+        board.winner = self.winner
+        board.threats = self.threats[:]
+        board.first = self.first
+        board.undo = self.undo[:]
+        return board
+
+    # Piece at a single cell, EMPTY if the cell is free
+    def piece_at(self, row, col):
+        bit = 1 << (col * COLUMN_HEIGHT + row)
+        if self.masks[PLAYER_PIECE] & bit:
+            return PLAYER_PIECE
+        if self.masks[AI_PIECE] & bit:
+            return AI_PIECE
+        return EMPTY
+
+    # Row access so board[r][c] keeps working for drawing code
+    def __getitem__(self, row):
+        return [self.piece_at(row, c) for c in range(COLUMN_COUNT)]
+
+
+# Initialize an empty game board
+def create_board():
+    return Board()
+
+# Drop a piece into the specified column. Only the winning lines through the new
+# piece can have been completed, or left one cell short, so only those are checked:
+# that finds a win and keeps the threat cells of both sides up to date.
+def drop_piece(board, row, col, piece):
+    index = col * COLUMN_HEIGHT + row
+    bit = 1 << index
+    mask = board.masks[piece] | bit
+    board.masks[piece] = mask
+    board.heights[col] = row + 1
+    board.key ^= ZOBRIST_KEYS[piece][index]
+    board.mirror_key ^= ZOBRIST_MIRROR_KEYS[piece][index]
+    threats = board.threats
+    undo = board.undo
+    if not undo:
+        board.first = piece
+    undo.append((threats[PLAYER_PIECE], threats[AI_PIECE], board.winner))
+    # The opponent's lines through this cell are blocked now, but any of them that
+    # was one piece short was only missing this cell
+    opp_piece = PLAYER_PIECE if piece == AI_PIECE else AI_PIECE
+    threats[opp_piece] &= ~bit
+    own = threats[piece] & ~bit
+    occupied = mask | board.masks[opp_piece]
+    for line in CELL_LINES[index]:
+        missing = line & ~mask
+        if not missing:
+            if not board.winner:
+                board.winner = piece
+        elif not missing & (missing - 1) and not missing & occupied:
+            own |= missing
+    threats[piece] = own
+
+# Take back the top piece of a column. Pieces must be taken back in the reverse order
+# they were dropped (undo of drop_piece).
+def remove_piece(board, col):
+    row = board.heights[col] - 1
+    index = col * COLUMN_HEIGHT + row
+    bit = 1 << index
+    piece = PLAYER_PIECE if board.masks[PLAYER_PIECE] & bit else AI_PIECE
+    board.masks[piece] &= ~bit
+    board.heights[col] = row
+    board.key ^= ZOBRIST_KEYS[piece][index]
+    board.mirror_key ^= ZOBRIST_MIRROR_KEYS[piece][index]
+    board.threats[PLAYER_PIECE], board.threats[AI_PIECE], board.winner = board.undo.pop()
+
+# Compact unique key of a position: the AI pieces plus one marker bit above the top
+# piece of every column. Fits in COLUMN_COUNT * COLUMN_HEIGHT bits.
+def position_key(board):
+    return board.masks[AI_PIECE] + (board.masks[PLAYER_PIECE] | board.masks[AI_PIECE]) + BOTTOM_MASK
+
+# Mirror a bitboard mask (or a position_key) left to right
+def mirror_mask(mask):
+    mirrored = 0
+    for col in range(COLUMN_COUNT):
+        mirrored |= ((mask >> (col * COLUMN_HEIGHT)) & COLUMN_BITS) << ((COLUMN_COUNT - 1 - col) * COLUMN_HEIGHT)
+    return mirrored
+
+# Counts of how often the searches made use of the board's left-right symmetry
+class SymmetryStats:
+    def __init__(self):
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.mirrored_probes = 0  # table lookups made through the mirror image
+        self.mirrored_hits = 0
+        self.symmetric_nodes = 0  # symmetric positions searched
+        self.skipped_moves = 0  # mirrored duplicate moves not searched
+
+    def stats(self):
+        return {"mirrored_probes": self.mirrored_probes, "mirrored_hits": self.mirrored_hits,
+                "symmetric_nodes": self.symmetric_nodes, "skipped_moves": self.skipped_moves}
+
+
+symmetry_stats = SymmetryStats()
+
+# Cache key for a position and the side to move, shared by a position and its mirror
+# image: the smaller of the two Zobrist hashes. Returns the key and whether it is the
+# mirror's, in which case stored columns must be flipped with COLUMN_COUNT - 1 - col.
+def search_key(board, maximizingPlayer):
+    key, mirror_key = board.key, board.mirror_key
+    if not maximizingPlayer:
+        key ^= ZOBRIST_MIN_TO_MOVE
+        mirror_key ^= ZOBRIST_MIN_TO_MOVE
+    if mirror_key < key:
+        return mirror_key, True
+    return key, False
+
+# On a left-right symmetric board a move and its mirror lead to mirrored positions
+# with the same value, so only the first of each pair in moves is kept
+def unique_moves(board, moves):
+    if board.key != board.mirror_key:
+        return moves
+    symmetry_stats.symmetric_nodes += 1
+    unique = [col for index, col in enumerate(moves) if COLUMN_COUNT - 1 - col not in moves[:index]]
+    symmetry_stats.skipped_moves += len(moves) - len(unique)
+    return unique
+
+# Check if a location in a column is a valid move
+def is_valid_location(board, col):
+    return board.heights[col] < ROW_COUNT
+
+# Get the next open row in a column
+def get_next_open_row(board, col):
+    row = board.heights[col]
+    if row < ROW_COUNT:
+        return row
+
+# Check if the board is full
+def is_board_full(board):
+    return (board.masks[PLAYER_PIECE] | board.masks[AI_PIECE]) & TOP_MASK == TOP_MASK
+
+# Check if a player has a winning move on the board
+def winning_move(board, piece):
+    return board.winner == piece
+
+# Bitmask of the empty cells that would complete a line for a piece, kept up to date
+# by drop_piece
+def winning_cells(board, piece):
+    return board.threats[piece]
+
+# Bitmask of the cells where the next piece in each column would land
+def playable_cells(board):
+    return ((board.masks[PLAYER_PIECE] | board.masks[AI_PIECE]) + BOTTOM_MASK) & BOARD_MASK
+
+# Evaluate the score of a window for a specific player. score_position computes the
+# same sum over every window at once with bit-parallel counts.
+def evaluate_window(window, piece):
+    score = 0
+    opp_piece = PLAYER_PIECE
+    if piece == PLAYER_PIECE:
+        opp_piece = AI_PIECE
+
+    if window.count(piece) == WINDOW_LENGTH:
+        score += 100
+    elif window.count(piece) == WINDOW_LENGTH - 1 and window.count(EMPTY) == 1:
+        score += 5
+    elif window.count(piece) == WINDOW_LENGTH - 2 and window.count(EMPTY) == 2:
+        score += 2
+
+    if window.count(opp_piece) == WINDOW_LENGTH - 1 and window.count(EMPTY) == 1:
+        score -= 4
+
+    return score
+
+# Count a piece mask over all windows of one direction at once. Returns the window
+# starts holding exactly WINDOW_LENGTH - 2, WINDOW_LENGTH - 1 and WINDOW_LENGTH of
+# the pieces (two, three and four in the standard game), and the starts of windows
+# holding none of them.
+def count_windows(mask, shift, starts):
+    if WINDOW_LENGTH != 4:
+        return _count_windows_any_length(mask, shift, starts)
+    x0, x1, x2, x3 = mask, mask >> shift, mask >> (2 * shift), mask >> (3 * shift)
+    # Bit-sliced adder: the count of four bits as (bit2, bit1, bit0)
+    s1, c1 = x0 ^ x1, x0 & x1
+    s2, c2 = x2 ^ x3, x2 & x3
+    bit0 = s1 ^ s2
+    bit1 = (c1 ^ c2) | (s1 & s2)
+    bit2 = c1 & c2
+    two = starts & bit1 & ~bit0
+    three = starts & bit1 & bit0
+    four = starts & bit2
+    none = starts & ~(x0 | x1 | x2 | x3)
+    return two, three, four, none
+
+# count_windows for any line length: a ripple-carry counter with one bit plane per
+# bit of the count
+def _count_windows_any_length(mask, shift, starts):
+    planes = []
+    covered = 0
+    for k in range(WINDOW_LENGTH):
+        carry = mask >> (k * shift)
+        covered |= carry
+        for bit, plane in enumerate(planes):
+            planes[bit], carry = plane ^ carry, plane & carry
+            if not carry:
+                break
+        if carry:
+            planes.append(carry)
+
+    def exactly(count):
+        if count >> len(planes):
+            return 0
+        found = starts
+        for bit, plane in enumerate(planes):
+            found &= plane if count >> bit & 1 else ~plane
+        return found
+
+    return (exactly(WINDOW_LENGTH - 2), exactly(WINDOW_LENGTH - 1), exactly(WINDOW_LENGTH),
+            starts & ~covered)
+
+# Evaluation bonus for each latent threat (a winning cell that cannot be played yet)
+# on one of its owner's good rows, see GOOD_THREAT_ROWS. 0 switches it off.
+THREAT_PARITY_WEIGHT = 6
+
+# Score the position of the board for a specific player
+def score_position(board, piece):
+    opp_piece = PLAYER_PIECE
+    if piece == PLAYER_PIECE:
+        opp_piece = AI_PIECE
+    own = board.masks[piece]
+    opp = board.masks[opp_piece]
+
+    score = (own & CENTER_MASK).bit_count() * 3
+    for shift, starts in zip(LINE_SHIFTS, WINDOW_STARTS):
+        own_two, own_three, own_four, own_none = count_windows(own, shift, starts)
+        _, opp_three, _, opp_none = count_windows(opp, shift, starts)
+        # Same weights as evaluate_window (named for four in a row)
+        score += 100 * own_four.bit_count()
+        score += 5 * (own_three & opp_none).bit_count()
+        score += 2 * (own_two & opp_none).bit_count()
+        score -= 4 * (opp_three & own_none).bit_count()
+
+    # Threat parity: late in the game the columns fill up and a threat on the right
+    # row for its owner usually decides the game
+    if THREAT_PARITY_WEIGHT:
+        latent = ~playable_cells(board)
+        own_rows, opp_rows = GOOD_THREAT_ROWS if board.first == piece else GOOD_THREAT_ROWS[::-1]
+        score += THREAT_PARITY_WEIGHT * ((board.threats[piece] & latent & own_rows).bit_count() -
+                                         (board.threats[opp_piece] & latent & opp_rows).bit_count())
+
+    return score
+
+# Check if the current board state is a terminal node
+def is_terminal_node(board):
+    return board.winner != EMPTY or is_board_full(board)
+
+# Rough size of one evaluation cache entry in bytes (key, value and the dict's links)
+EVAL_ENTRY_BYTES = 160
+
+
+# Bounded cache of leaf evaluations with least-recently-used eviction, shared by
+# minimax, alpha_beta_ab and pick_best_move. Positions that are reached again, through
+# another move order, by the next iteration of iterative deepening or on the next
+# move, are not scored again. A position and its mirror image share an entry. Clear it
+# after changing the evaluation weights.
+class EvalCache:
+    def __init__(self, size_mb=8):
+        self.max_entries = max(1, size_mb * 1024 * 1024 // EVAL_ENTRY_BYTES)
+        self.entries = OrderedDict()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clear(self):
+        self.entries = OrderedDict()
+        self.reset_stats()
+
+    # Return the cached value for a key, or None
+    def probe(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def store(self, key, value):
+        entries = self.entries
+        entries[key] = value
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions, "entries": len(self.entries),
+                "memory_mb": len(self.entries) * EVAL_ENTRY_BYTES / (1024 * 1024)}
+
+
+# Cache used by the searches; None disables it
+eval_cache = EvalCache()
+
+# score_position through eval_cache. The score depends on the piece and, through the
+# threat parity, on which piece moved first, so both are part of the key.
+def evaluate(board, piece):
+    if eval_cache is None:
+        return score_position(board, piece)
+    key = (min(board.key, board.mirror_key) << 4) | (piece << 2) | board.first
+    score = eval_cache.probe(key)
+    if score is None:
+        score = score_position(board, piece)
+        eval_cache.store(key, score)
+    return score
+
+# Opening book consulted by minimax and alpha_beta_ab before searching a position.
+# None disables it; opening_book.load_book() installs one.
+opening_book = None
+
+# Minimax algorithm. Setting the stop event (a threading.Event) ends the search with
+# SearchTimeout.
+def minimax(board, depth, maximizingPlayer, stop=None):
+    if stop is not None and stop.is_set():
+        raise SearchTimeout()
+    valid_locations = get_valid_locations(board)
+    is_terminal = is_terminal_node(board)
+    start_time = time.time()
+    nodes_explored = 0  # Initialize nodes_explored
+
+    if depth == 0 or is_terminal:
+        if is_terminal:
+            if winning_move(board, AI_PIECE):
+                return None, 100000000000000, nodes_explored, 0
+            elif winning_move(board, PLAYER_PIECE):
+                return None, -10000000000000, nodes_explored, 0
+            else:
+                return None, 0, nodes_explored, 0
+        else:
+            return None, evaluate(board, AI_PIECE), nodes_explored, 0
+
+    # Positions in the opening book are answered without searching
+    if opening_book is not None:
+        book_entry = opening_book.lookup(board, maximizingPlayer)
+        if book_entry is not None:
+            return book_entry[0], book_entry[1], nodes_explored, 0
+
+    valid_locations = unique_moves(board, valid_locations)
+    if maximizingPlayer:
+        best_value = -math.inf
+        column = random.choice(valid_locations)
+        for col in valid_locations:
+            row = get_next_open_row(board, col)
+            drop_piece(board, row, col, AI_PIECE)
+            _, new_score, explored, _ = minimax(board, depth - 1, False, stop)
+            remove_piece(board, col)
+            nodes_explored += 1 + explored  # Count this child and its whole subtree
+            if new_score > best_value:
+                best_value = new_score
+                column = col
+    else:
+        best_value = math.inf
+        column = random.choice(valid_locations)
+        for col in valid_locations:
+            row = get_next_open_row(board, col)
+            drop_piece(board, row, col, PLAYER_PIECE)
+            _, new_score, explored, _ = minimax(board, depth - 1, True, stop)
+            remove_piece(board, col)
+            nodes_explored += 1 + explored  # Count this child and its whole subtree
+            if new_score < best_value:
+                best_value = new_score
+                column = col
+
+    end_time = time.time()
+    elapsed_time = (end_time - start_time) * 1000  # in milliseconds
+    return column, best_value, nodes_explored, elapsed_time
+
+# Bound types stored in the transposition table
+TT_EXACT = 0
+TT_LOWER = 1
+TT_UPPER = 2
+
+# Rough size of one table slot in bytes (entry tuple, its integers and the list slot)
+TT_ENTRY_BYTES = 160
+
+
+# Fixed-size transposition table for alpha_beta_ab. Every bucket has two slots: a
+# depth-preferred slot that only yields to equal or deeper searches, and an
+# always-replace slot for everything else.
+class TranspositionTable:
+    def __init__(self, size_mb=16):
+        self.bucket_count = max(1, size_mb * 1024 * 1024 // (2 * TT_ENTRY_BYTES))
+        self.slots = [None] * (2 * self.bucket_count)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.cutoffs = 0
+        self.stores = 0
+
+    def clear(self):
+        self.slots = [None] * (2 * self.bucket_count)
+        self.reset_stats()
+
+    # Return the (key, depth, value, bound, move) entry for a key, or None
+    def probe(self, key):
+        index = 2 * (key % self.bucket_count)
+        entry = self.slots[index]
+        if entry is None or entry[0] != key:
+            entry = self.slots[index + 1]
+            if entry is None or entry[0] != key:
+                self.misses += 1
+                return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, value, bound, move):
+        index = 2 * (key % self.bucket_count)
+        deep = self.slots[index]
+        entry = (key, depth, value, bound, move)
+        if deep is None or deep[0] == key or depth >= deep[1]:
+            self.slots[index] = entry
+        else:
+            self.slots[index + 1] = entry
+        self.stores += 1
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "cutoffs": self.cutoffs, "stores": self.stores}
+
+
+# Table shared by every alpha_beta_ab call, kept across moves of a game
+transposition_table = TranspositionTable()
+
+# Raised inside the searches when the deadline has passed or the stop event is set
+class SearchTimeout(Exception):
+    pass
+
+
+# Move ordering for alpha_beta_ab. Each heuristic can be switched off on its own:
+# immediate wins and forced blocks first, then the hash/hint move, then killer
+# moves for the current ply, then the rest by history score in center-out order.
+class MoveOrdering:
+    def __init__(self, center_first=True, tactical=True, killers=True, history=True):
+        self.center_first = center_first
+        self.tactical = tactical
+        self.use_killers = killers
+        self.use_history = history
+        self.clear()
+
+    def clear(self):
+        self.killers = [[None, None] for _ in range(ROW_COUNT * COLUMN_COUNT + 1)]
+        self.history = [[0] * COLUMN_COUNT for _ in range(3)]
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.pruned_moves = 0
+
+    # Halve the history scores so old games and moves fade out
+    def age(self):
+        for scores in self.history:
+            for col in range(COLUMN_COUNT):
+                scores[col] //= 2
+
+    def order(self, board, valid_locations, piece, first_move=None):
+        if self.center_first:
+            moves = [col for col in CENTER_ORDER if col in valid_locations]
+        else:
+            moves = list(valid_locations)
+        if self.use_history:
+            scores = self.history[piece]
+            moves.sort(key=lambda col: -scores[col])
+
+        front = []
+        if self.use_killers:
+            for killer in self.killers[sum(board.heights)]:
+                if killer in moves:
+                    front.append(killer)
+        if first_move in moves:
+            front.insert(0, first_move)
+        if self.tactical:
+            playable = playable_cells(board)
+            opp_piece = PLAYER_PIECE if piece == AI_PIECE else AI_PIECE
+            blocks = winning_cells(board, opp_piece) & playable
+            wins = winning_cells(board, piece) & playable
+            forced = []
+            for mask in (wins, blocks):
+                if mask:
+                    for col in moves:
+                        if mask >> (col * COLUMN_HEIGHT) & ((1 << COLUMN_HEIGHT) - 1) and col not in forced:
+                            forced.append(col)
+            front = forced + front
+
+        ordered = []
+        for col in front + moves:
+            if col not in ordered:
+                ordered.append(col)
+        return ordered
+
+    # Called when the move at index move_index caused a beta cutoff
+    def record_cutoff(self, board, piece, col, depth, move_index, pruned):
+        self.cutoffs += 1
+        self.pruned_moves += pruned
+        if move_index == 0:
+            self.first_move_cutoffs += 1
+        killers = self.killers[sum(board.heights)]
+        if killers[0] != col:
+            killers[1] = killers[0]
+            killers[0] = col
+        self.history[piece][col] += depth * depth
+
+    def stats(self):
+        first_rate = self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+        return {"cutoffs": self.cutoffs, "first_move_cutoff_rate": first_rate, "pruned_moves": self.pruned_moves}
+
+
+# Ordering shared by every alpha_beta_ab call
+move_ordering = MoveOrdering()
+
+# Counts of how often alpha_beta_ab's threat analysis settled a node or cut a move
+class ThreatStats:
+    def __init__(self):
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.immediate_wins = 0  # nodes answered by a playable winning cell
+        self.forced_nodes = 0  # nodes where the opponent's threat had to be blocked
+        self.cut_moves = 0  # moves not searched because they lose at once
+
+    def stats(self):
+        return {"immediate_wins": self.immediate_wins, "forced_nodes": self.forced_nodes,
+                "cut_moves": self.cut_moves}
+
+
+threat_stats = ThreatStats()
+
+# Column of a playable winning cell for the piece to move, or None
+def immediate_win(board, piece):
+    wins = board.threats[piece] & playable_cells(board)
+    if not wins:
+        return None
+    return ((wins & -wins).bit_length() - 1) // COLUMN_HEIGHT
+
+# The moves in moves that do not lose at once to the opponent's threats: only the
+# block when the opponent has a playable winning cell, and never the cell right below
+# one of its winning cells. Every other move lets the opponent win on the next ply,
+# so a search at least two plies deep gets the same value without them. If every
+# move loses, the first one is kept.
+def threat_moves(board, moves, piece):
+    opp_piece = PLAYER_PIECE if piece == AI_PIECE else AI_PIECE
+    threats = board.threats[opp_piece]
+    if not threats:
+        return moves
+    playable = playable_cells(board)
+    forced = threats & playable
+    if forced:
+        threat_stats.forced_nodes += 1
+        if forced & (forced - 1):
+            safe = 0  # two threats at once cannot both be blocked
+        else:
+            safe = forced & ~(threats >> 1)
+    else:
+        safe = playable & ~(threats >> 1)
+    kept = [col for col in moves if safe >> (col * COLUMN_HEIGHT) & COLUMN_BITS]
+    if not kept:
+        kept = moves[:1]
+    threat_stats.cut_moves += len(moves) - len(kept)
+    return kept
+
+# Alpha-beta pruning version of the minimax algorithm
+def alpha_beta_ab(board, depth, alpha, beta, maximizingPlayer, table=transposition_table, deadline=None,
+                  first_move=None, ordering=move_ordering, stop=None):
+    if (deadline is not None and time.time() > deadline) or (stop is not None and stop.is_set()):
+        raise SearchTimeout()
+    valid_locations = get_valid_locations(board)
+    is_terminal = is_terminal_node(board)
+    start_time = time.time()
+    nodes_explored = 0  # Initialize nodes_explored
+
+    if depth == 0 or is_terminal:
+        if is_terminal:
+            if winning_move(board, AI_PIECE):
+                return None, 100000000000000, nodes_explored, 0
+            elif winning_move(board, PLAYER_PIECE):
+                return None, -10000000000000, nodes_explored, 0
+            else:
+                return None, 0, nodes_explored, 0
+        else:
+            return None, evaluate(board, AI_PIECE), nodes_explored, 0
+
+    # Positions in the opening book are answered without searching
+    if opening_book is not None:
+        book_entry = opening_book.lookup(board, maximizingPlayer)
+        if book_entry is not None:
+            return book_entry[0], book_entry[1], nodes_explored, 0
+
+    # A playable winning cell is the best move there is
+    piece = AI_PIECE if maximizingPlayer else PLAYER_PIECE
+    win_col = immediate_win(board, piece)
+    if win_col is not None:
+        threat_stats.immediate_wins += 1
+        return win_col, 100000000000000 if maximizingPlayer else -10000000000000, nodes_explored, 0
+
+    # Probe the transposition table; the side to move is part of the key, and a
+    # position shares its entry with its mirror image
+    key, flipped = search_key(board, maximizingPlayer)
+    alpha_orig, beta_orig = alpha, beta
+    entry = table.probe(key) if table is not None else None
+    if flipped and table is not None:
+        symmetry_stats.mirrored_probes += 1
+        if entry is not None:
+            symmetry_stats.mirrored_hits += 1
+    if entry is not None:
+        _, entry_depth, entry_value, entry_bound, entry_move = entry
+        if flipped and entry_move is not None:
+            entry_move = COLUMN_COUNT - 1 - entry_move
+        if entry_depth >= depth:
+            if entry_bound == TT_EXACT:
+                table.cutoffs += 1
+                return entry_move, entry_value, nodes_explored, 0
+            elif entry_bound == TT_LOWER:
+                alpha = max(alpha, entry_value)
+            else:
+                beta = min(beta, entry_value)
+            if alpha >= beta:
+                table.cutoffs += 1
+                return entry_move, entry_value, nodes_explored, 0
+        if first_move is None:
+            first_move = entry_move
+
+    # Search the hinted or stored best move first, then the ordering's choices
+    if ordering is not None:
+        valid_locations = ordering.order(board, valid_locations, piece, first_move)
+    elif first_move in valid_locations:
+        valid_locations.remove(first_move)
+        valid_locations.insert(0, first_move)
+    valid_locations = unique_moves(board, valid_locations)
+    if depth >= 2:
+        valid_locations = threat_moves(board, valid_locations, piece)
+
+    if maximizingPlayer:
+        value = -math.inf
+        column = random.choice(valid_locations)
+        for index, col in enumerate(valid_locations):
+            row = get_next_open_row(board, col)
+            drop_piece(board, row, col, AI_PIECE)
+            _, new_score, explored, _ = alpha_beta_ab(board, depth - 1, alpha, beta, False, table, deadline,
+                                                      None, ordering, stop)
+            remove_piece(board, col)
+            nodes_explored += 1 + explored  # Count this child and its whole subtree
+            if new_score > value:
+                value = new_score
+                column = col
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                if ordering is not None:
+                    ordering.record_cutoff(board, piece, col, depth, index, len(valid_locations) - index - 1)
+                break
+    else:
+        value = math.inf
+        column = random.choice(valid_locations)
+        for index, col in enumerate(valid_locations):
+            row = get_next_open_row(board, col)
+            drop_piece(board, row, col, PLAYER_PIECE)
+            _, new_score, explored, _ = alpha_beta_ab(board, depth - 1, alpha, beta, True, table, deadline,
+                                                      None, ordering, stop)
+            remove_piece(board, col)
+            nodes_explored += 1 + explored  # Count this child and its whole subtree
+            if new_score < value:
+                value = new_score
+                column = col
+            beta = min(beta, value)
+            if alpha >= beta:
+                if ordering is not None:
+                    ordering.record_cutoff(board, piece, col, depth, index, len(valid_locations) - index - 1)
+                break
+
+    if table is not None:
+        if value <= alpha_orig:
+            bound = TT_UPPER
+        elif value >= beta_orig:
+            bound = TT_LOWER
+        else:
+            bound = TT_EXACT
+        table.store(key, depth, value, bound, COLUMN_COUNT - 1 - column if flipped else column)
+
+    end_time = time.time()
+    elapsed_time = (end_time - start_time) * 1000  # in milliseconds
+    return column, value, nodes_explored, elapsed_time
+
+# Process pool for parallel_search and the root bound its workers share
+_search_pool = None
+_search_pool_workers = 0
+_shared_bound = None
+
+def _init_search_worker(shared_bound, geometry):
+    global _shared_bound
+    _shared_bound = shared_bound
+    configure(geometry)
+
+def get_search_pool(workers):
+    global _search_pool, _search_pool_workers, _shared_bound
+    if _search_pool is None or _search_pool_workers != workers:
+        if _search_pool is not None:
+            _search_pool.shutdown(cancel_futures=True)
+        _shared_bound = multiprocessing.Value("d", 0.0)
+        _search_pool = ProcessPoolExecutor(workers, initializer=_init_search_worker,
+                                           initargs=(_shared_bound, GEOMETRY))
+        _search_pool_workers = workers
+    return _search_pool
+
+# Search one root move (already played on board) and publish its value as the new
+# shared root bound if it improves on it. Returns the bound the move was searched
+# with so the caller can tell exact values from cut-off bounds.
+def _search_root_move(board, col, depth, maximizingPlayer, deadline, reset_tables, stop=None):
+    start_time = time.time()
+    table, ordering = transposition_table, move_ordering
+    if reset_tables:
+        table, ordering = TranspositionTable(), MoveOrdering()
+    bound = _shared_bound.value
+    if maximizingPlayer:
+        alpha, beta = bound, math.inf
+    else:
+        alpha, beta = -math.inf, bound
+    _, value, explored, _ = alpha_beta_ab(board, depth - 1, alpha, beta, not maximizingPlayer, table, deadline,
+                                          None, ordering, stop)
+    with _shared_bound.get_lock():
+        if (value > _shared_bound.value) if maximizingPlayer else (value < _shared_bound.value):
+            _shared_bound.value = value
+    return col, value, bound, explored + 1, os.getpid(), (time.time() - start_time) * 1000
+
+# Root-parallel alpha-beta: the root moves are split across a process pool whose
+# workers share the best root value found so far as their alpha (or beta) bound.
+# With young_brothers_wait the first move is searched before the others are handed
+# out, so every worker starts with a real bound. Returns the same column and score as
+# alpha_beta_ab at the same depth, plus a dict with per-worker node counts and, when
+# compare_serial is set, a serial run for the speedup. Setting the stop event ends the
+# search with SearchTimeout.
+def parallel_search(board, depth, workers=None, maximizingPlayer=True, deadline=None, first_move=None,
+                    young_brothers_wait=True, compare_serial=False, stop=None):
+    workers = workers or os.cpu_count() or 1
+    start_time = time.time()
+    pool = get_search_pool(workers)
+    piece = AI_PIECE if maximizingPlayer else PLAYER_PIECE
+    win_col = immediate_win(board, piece)
+    if win_col is not None:
+        best_value = 100000000000000 if maximizingPlayer else -10000000000000
+        elapsed_time = (time.time() - start_time) * 1000  # in milliseconds
+        info = {"workers": {}}
+        if compare_serial:
+            _compare_serial(board, depth, maximizingPlayer, win_col, best_value, elapsed_time, info)
+        return win_col, best_value, 0, elapsed_time, info
+    order = unique_moves(board, MoveOrdering().order(board, get_valid_locations(board), piece, first_move))
+    if depth >= 2:
+        order = threat_moves(board, order, piece)
+    _shared_bound.value = -math.inf if maximizingPlayer else math.inf
+
+    def child(col):
+        child_board = board.copy()
+        drop_piece(child_board, get_next_open_row(child_board, col), col, piece)
+        return child_board
+
+    results = []
+    if young_brothers_wait:
+        results.append(_search_root_move(child(order[0]), order[0], depth, maximizingPlayer, deadline,
+                                         compare_serial, stop))
+        remaining = order[1:]
+    else:
+        remaining = order
+    futures = [pool.submit(_search_root_move, child(col), col, depth, maximizingPlayer, deadline, compare_serial)
+               for col in remaining]
+    # The workers cannot see the stop event; they run until their deadline, but the
+    # search returns as soon as it is set
+    while True:
+        done, not_done = wait(futures, timeout=0.05 if stop is not None else None, return_when=FIRST_EXCEPTION)
+        if not not_done or any(future.exception() is not None for future in done):
+            break
+        if stop is not None and stop.is_set():
+            for future in not_done:
+                future.cancel()
+            raise SearchTimeout()
+    for future in not_done:
+        future.cancel()
+    for future in done:
+        if future.exception() is not None:
+            raise future.exception()
+    results += [future.result() for future in futures]
+
+    # A value is exact when it beat the bound it was searched with. Ties that were
+    # only bounded are re-searched so the first best move in order wins, as in the
+    # serial search.
+    values = {col: value for col, value, _, _, _, _ in results}
+    exact = {col: (value > bound) if maximizingPlayer else (value < bound)
+             for col, value, bound, _, _, _ in results}
+    best_value = max(values.values()) if maximizingPlayer else min(values.values())
+    column = None
+    for col in order:
+        if values[col] != best_value:
+            continue
+        if not exact[col]:
+            _, values[col], _, _ = alpha_beta_ab(child(col), depth - 1, -math.inf, math.inf, not maximizingPlayer,
+                                                 TranspositionTable(1), deadline, stop=stop)
+        if values[col] == best_value:
+            column = col
+            break
+
+    nodes_explored = sum(nodes for _, _, _, nodes, _, _ in results)
+    worker_nodes = {}
+    for _, _, _, nodes, pid, _ in results:
+        worker_nodes[pid] = worker_nodes.get(pid, 0) + nodes
+    elapsed_time = (time.time() - start_time) * 1000  # in milliseconds
+    info = {"workers": worker_nodes}
+
+    if compare_serial:
+        _compare_serial(board, depth, maximizingPlayer, column, best_value, elapsed_time, info)
+
+    return column, best_value, nodes_explored, elapsed_time, info
+
+# Run the serial search parallel_search stands in for and add it, the speedup and
+# whether both agree to parallel_search's info dict
+def _compare_serial(board, depth, maximizingPlayer, column, value, elapsed_time, info):
+    serial_start = time.time()
+    serial = alpha_beta_ab(board.copy(), depth, -math.inf, math.inf, maximizingPlayer, TranspositionTable(),
+                           None, None, MoveOrdering())
+    serial_time = (time.time() - serial_start) * 1000
+    info["serial"] = {"column": serial[0], "value": serial[1], "nodes": serial[2], "time_ms": serial_time}
+    info["speedup"] = serial_time / elapsed_time if elapsed_time else None
+    info["matches_serial"] = (serial[0], serial[1]) == (column, value)
+
+# Exact endgame solver. Scores are from the side to move's point of view and count
+# the distance to the win: winning with the move made when m pieces are on the board
+# scores BOARD_CELLS + 1 - m, losing scores the negative, and a draw scores 0.
+
+# Positions with this many empty cells or fewer are solved exactly by iterative_deepening
+SOLVER_EMPTY_CELLS = 20
+
+# Key for the solver's table, folded with the mirror image like the search's keys
+def _solver_key(board, piece):
+    return search_key(board, piece == AI_PIECE)[0]
+
+# Negamax alpha-beta over exact win-distance scores, used with null windows by solve()
+def _solve_negamax(board, piece, alpha, beta, ply, table, counter, deadline, stop):
+    counter[0] += 1
+    if counter[0] % 256 == 0 and ((deadline is not None and time.time() > deadline) or
+                                  (stop is not None and stop.is_set())):
+        raise SearchTimeout()
+    if ply == BOARD_CELLS:
+        return 0
+    opp_piece = PLAYER_PIECE if piece == AI_PIECE else AI_PIECE
+    playable = playable_cells(board)
+    if winning_cells(board, piece) & playable:
+        return BOARD_CELLS + 1 - ply
+
+    # Moves that leave the opponent an immediate win are lost, so only safe moves
+    # are searched: a single forced block, and never the cell below a threat.
+    threats = winning_cells(board, opp_piece)
+    forced = threats & playable
+    if forced:
+        if forced & (forced - 1):
+            return -(BOARD_CELLS - ply)  # two threats at once, cannot block both
+        playable = forced
+    safe = playable & ~(threats >> 1)
+    if not safe:
+        return -(BOARD_CELLS - ply)
+
+    # We cannot win before our next-but-one move
+    upper = BOARD_CELLS - 1 - ply
+    entry = table.probe(_solver_key(board, piece))
+    if entry is not None:
+        if entry[3] == TT_UPPER:
+            upper = min(upper, entry[2])
+        else:
+            alpha = max(alpha, entry[2])
+    if beta > upper:
+        beta = upper
+    if alpha >= beta:
+        return beta
+
+    # Safe moves ordered by how many winning cells they create, center first on ties
+    moves = []
+    for col in unique_moves(board, CENTER_ORDER):
+        if safe >> (col * COLUMN_HEIGHT) & COLUMN_BITS:
+            drop_piece(board, board.heights[col], col, piece)
+            moves.append((-winning_cells(board, piece).bit_count(), len(moves), col))
+            remove_piece(board, col)
+    moves.sort()
+
+    for _, _, col in moves:
+        drop_piece(board, board.heights[col], col, piece)
+        score = -_solve_negamax(board, opp_piece, -beta, -alpha, ply + 1, table, counter, deadline, stop)
+        remove_piece(board, col)
+        if score >= beta:
+            table.store(_solver_key(board, piece), BOARD_CELLS - ply, score, TT_LOWER, col)
+            return score
+        if score > alpha:
+            alpha = score
+    table.store(_solver_key(board, piece), BOARD_CELLS - ply, alpha, TT_UPPER, None)
+    return alpha
+
+# Solve a position exactly with a sequence of null-window searches that bisect the
+# score range (MTD style). Returns a dict with the best column, the exact score for
+# the side to move, the winner (a piece, or None for a draw), how many moves the
+# winner still needs, and the nodes and time the proof took.
+def solve(board, maximizingPlayer=True, deadline=None, table=None, stop=None):
+    start_time = time.time()
+    board = board.copy()
+    piece = AI_PIECE if maximizingPlayer else PLAYER_PIECE
+    opp_piece = PLAYER_PIECE if piece == AI_PIECE else AI_PIECE
+    ply = sum(board.heights)
+    table = table if table is not None else TranspositionTable(32)
+    counter = [0]
+
+    low, high = -(BOARD_CELLS - ply), BOARD_CELLS + 1 - ply
+    while low < high:
+        middle = low + (high - low) // 2
+        if middle <= 0 and low // 2 < middle:
+            middle = low // 2
+        elif middle >= 0 and high // 2 > middle:
+            middle = high // 2
+        result = _solve_negamax(board, piece, middle, middle + 1, ply, table, counter, deadline, stop)
+        if result <= middle:
+            high = result
+        else:
+            low = result
+    score = low
+
+    # Best move: the first column whose reply is proven to hold the score
+    column = None
+    valid_locations = [col for col in CENTER_ORDER if is_valid_location(board, col)]
+    for col in valid_locations:
+        drop_piece(board, board.heights[col], col, piece)
+        if winning_move(board, piece):
+            reply = -(BOARD_CELLS + 1 - ply)
+        else:
+            reply = _solve_negamax(board, opp_piece, -score, -score + 1, ply + 1, table, counter, deadline,
+                                       stop)
+        remove_piece(board, col)
+        if -reply >= score:
+            column = col
+            break
+    if column is None:
+        column = valid_locations[0]
+
+    if score > 0:
+        winner, plies_to_win = piece, BOARD_CELLS + 2 - ply - score
+    elif score < 0:
+        winner, plies_to_win = opp_piece, BOARD_CELLS + 2 - ply + score
+    else:
+        winner, plies_to_win = None, None
+    return {"column": column, "score": score, "winner": winner,
+            "moves_to_win": (plies_to_win + 1) // 2 if plies_to_win is not None else None,
+            "nodes": counter[0], "time_ms": (time.time() - start_time) * 1000}
+
+# Iterative deepening driver around alpha_beta_ab. Searches depth 1, 2, 3, ... until
+# the time budget (in milliseconds) runs out and returns the move of the deepest
+# completed iteration, plus a dict with the depth reached and per-iteration stats.
+# Positions with at most solver_threshold empty cells are solved exactly first, with
+# half the budget; the result is in info["solver"]. Setting the stop event (a
+# threading.Event) ends the search early, and progress, if given, is called with
+# each completed iteration's stats. The ordering's history is aged once per call
+# unless age_ordering is False, for callers that age it themselves.
+def iterative_deepening(board, time_budget_ms, maximizingPlayer=True, table=transposition_table,
+                        max_depth=None, ordering=move_ordering, workers=1,
+                        solver_threshold=SOLVER_EMPTY_CELLS, stop=None, progress=None, age_ordering=True):
+    start_time = time.time()
+    if ordering is not None and age_ordering:
+        ordering.age()
+    deadline = start_time + time_budget_ms / 1000
+    empty_cells = ROW_COUNT * COLUMN_COUNT - sum(board.heights)
+    column, value = None, 0
+    nodes_explored = 0
+    iterations = []
+
+    if opening_book is not None:
+        book_entry = opening_book.lookup(board, maximizingPlayer)
+        if book_entry is not None:
+            column, value = book_entry
+            elapsed_time = (time.time() - start_time) * 1000  # in milliseconds
+            return column, value, 0, elapsed_time, {"depth": 0, "iterations": [], "book": True}
+
+    if 0 < empty_cells <= solver_threshold:
+        try:
+            solved = solve(board, maximizingPlayer, start_time + time_budget_ms / 2000, None, stop)
+        except SearchTimeout:
+            solved = None
+        if solved is not None:
+            if solved["winner"] == AI_PIECE:
+                value = 100000000000000
+            elif solved["winner"] == PLAYER_PIECE:
+                value = -10000000000000
+            elapsed_time = (time.time() - start_time) * 1000  # in milliseconds
+            return solved["column"], value, solved["nodes"], elapsed_time, {"depth": empty_cells, "iterations": [],
+                                                                             "solver": solved}
+
+    if max_depth is None:
+        max_depth = empty_cells
+    for depth in range(1, min(max_depth, empty_cells) + 1):
+        iteration_start = time.time()
+        try:
+            # Depth 1 always runs to completion so there is always a move to play
+            if workers > 1 and depth > 1:
+                col, new_value, explored, _, _ = parallel_search(board, depth, workers, maximizingPlayer, deadline,
+                                                                 column, stop=stop)
+            else:
+                col, new_value, explored, _ = alpha_beta_ab(board.copy(), depth, -math.inf, math.inf,
+                                                            maximizingPlayer, table, deadline if depth > 1 else None,
+                                                            column, ordering, stop)
+        except SearchTimeout:
+            break
+        column, value = col, new_value
+        nodes_explored += explored
+        # Effective branching factor: growth in nodes from one iteration to the next
+        ebf = explored / iterations[-1]["nodes"] if iterations and iterations[-1]["nodes"] else None
+        iterations.append({"depth": depth, "column": col, "value": new_value, "nodes": explored,
+                           "time_ms": (time.time() - iteration_start) * 1000, "ebf": ebf})
+        if progress is not None:
+            progress(iterations[-1])
+        # A proven win or loss will not change with deeper search
+        if value >= 100000000000000 or value <= -10000000000000:
+            break
+        if time.time() >= deadline:
+            break
+
+    if column is None:
+        column = random.choice(get_valid_locations(board))
+    elapsed_time = (time.time() - start_time) * 1000  # in milliseconds
+    info = {"depth": len(iterations), "iterations": iterations}
+    if ordering is not None:
+        info["ordering"] = ordering.stats()
+    return column, value, nodes_explored, elapsed_time, info
+
+# Pondering: while the human is to move, search the AI's reply to each likely human
+# move, in rounds with a doubling time slice, so the results sit in the shared
+# transposition table when the real move arrives. reply_budget() then shortens the
+# AI's thinking time by the work already done on the move that was played.
+class Ponderer:
+    def __init__(self, table=transposition_table, ordering=move_ordering, slice_ms=50, useful_depth=6):
+        self.table = table
+        self.ordering = ordering
+        self.slice_ms = slice_ms
+        self.useful_depth = useful_depth
+        self.hits = 0
+        self.misses = 0
+        self.time_saved_ms = 0.0
+        self.last_saved_ms = 0.0
+        self.predicted = None
+        self.ponder_depth = useful_depth
+        self.pondered = {}
+
+    # Ponder the position (human to move) until the stop event is set or every reply
+    # has been searched as far as it can go. pondered maps each searched move to the
+    # deepest (depth, time_ms to reach it, final) seen for the AI's reply. useful_depth,
+    # typically the depth of the AI's last full search, overrides the default for this ponder.
+    def ponder(self, board, stop, useful_depth=None):
+        self.pondered = {}
+        self.ponder_depth = useful_depth or self.useful_depth
+        # Age the history once per ponder, not once per time slice
+        self.ordering.age()
+        key, flipped = search_key(board, False)
+        entry = self.table.probe(key) if self.table is not None else None
+        predicted = entry[4] if entry is not None else None
+        if flipped and predicted is not None:
+            predicted = COLUMN_COUNT - 1 - predicted
+        candidates = self.ordering.order(board, get_valid_locations(board), PLAYER_PIECE, predicted)
+        self.predicted = candidates[0] if candidates else None
+        finished = set()
+        time_slice = self.slice_ms
+        while not stop.is_set() and len(finished) < len(candidates):
+            for col in candidates:
+                if stop.is_set():
+                    break
+                if col in finished:
+                    continue
+                child = board.copy()
+                drop_piece(child, get_next_open_row(child, col), col, PLAYER_PIECE)
+                if is_terminal_node(child):
+                    finished.add(col)
+                    continue
+                _, value, _, _, info = iterative_deepening(child, time_slice, True, self.table,
+                                                           ordering=self.ordering, stop=stop, age_ordering=False)
+                # Book and solver answers, proven results and searches to the end of the game are final
+                final = ("book" in info or "solver" in info or value >= 100000000000000 or
+                         value <= -10000000000000 or info["depth"] == ROW_COUNT * COLUMN_COUNT - sum(child.heights))
+                if final:
+                    finished.add(col)
+                depth = info["depth"]
+                if col not in self.pondered or depth >= self.pondered[col][0] or final:
+                    self.pondered[col] = (depth, sum(iteration["time_ms"] for iteration in info["iterations"]), final)
+            time_slice *= 2
+
+    # Called with the human's actual move. Returns the thinking time for the AI's reply.
+    # It is a hit when the move was the predicted one or its reply was pondered to at
+    # least the useful depth (or to a final answer); a hit takes the time the pondered search
+    # needed to reach its depth off the budget, but never below min_fraction of it.
+    def reply_budget(self, col, time_budget_ms, min_fraction=0.1):
+        depth, reached_ms, final = self.pondered.get(col, (0, 0.0, False))
+        if (depth > 0 and col == self.predicted) or depth >= self.ponder_depth or final:
+            self.hits += 1
+            budget = max(time_budget_ms - reached_ms, time_budget_ms * min_fraction)
+        else:
+            self.misses += 1
+            budget = time_budget_ms
+        self.last_saved_ms = time_budget_ms - budget
+        self.time_saved_ms += self.last_saved_ms
+        self.predicted = None
+        self.pondered = {}
+        return budget
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "time_saved_ms": self.time_saved_ms, "last_saved_ms": self.last_saved_ms}
+
+# Get valid locations for a move on the current board
+def get_valid_locations(board):
+    valid_locations = []
+    for col in range(COLUMN_COUNT):
+        if is_valid_location(board, col):
+            valid_locations.append(col)
+    return valid_locations
+
+# Choose the best move for the AI player
+def pick_best_move(board, piece):
+    valid_locations = unique_moves(board, get_valid_locations(board))
+    best_score = -10000
+    best_col = random.choice(valid_locations)
+    for col in valid_locations:
+        row = get_next_open_row(board, col)
+        drop_piece(board, row, col, piece)
+        score = evaluate(board, piece)
+        remove_piece(board, col)
+        if score > best_score:
+            best_score = score
+            best_col = col
+    return best_col
+
+# Build a board from a move string or a ROW_COUNT x COLUMN_COUNT array. Move strings
+# list the columns played as digits 1 to COLUMN_COUNT, starting with first_piece, so
+# they only cover boards up to nine columns wide. Arrays use the game's layout (row 0
+# is the bottom row) with EMPTY, PLAYER_PIECE and AI_PIECE cells.
+# Returns the board and the piece to move.
+def parse_position(position, first_piece=PLAYER_PIECE):
+    second_piece = AI_PIECE if first_piece == PLAYER_PIECE else PLAYER_PIECE
+    board = create_board()
+    if isinstance(position, str):
+        if COLUMN_COUNT > 9:
+            raise ValueError(f"move strings cover at most 9 columns, send a {ROW_COUNT}x{COLUMN_COUNT} board array")
+        for index, move in enumerate(position.strip()):
+            if not move.isdigit() or not 1 <= int(move) <= COLUMN_COUNT:
+                raise ValueError(f"invalid move {move!r} in {position!r}")
+            col = int(move) - 1
+            if not is_valid_location(board, col):
+                raise ValueError(f"column {move} is full in {position!r}")
+            drop_piece(board, get_next_open_row(board, col), col, first_piece if index % 2 == 0 else second_piece)
+        piece = first_piece if len(position.strip()) % 2 == 0 else second_piece
+        return board, piece
+
+    if len(position) != ROW_COUNT or any(len(row) != COLUMN_COUNT for row in position):
+        raise ValueError(f"expected a {ROW_COUNT}x{COLUMN_COUNT} board")
+    for col in range(COLUMN_COUNT):
+        for row in range(ROW_COUNT):
+            piece = int(position[row][col])
+            if piece == EMPTY:
+                continue
+            if piece not in (PLAYER_PIECE, AI_PIECE):
+                raise ValueError(f"invalid piece {piece} at row {row}, column {col}")
+            if board.heights[col] != row:
+                raise ValueError(f"floating piece at row {row}, column {col}")
+            drop_piece(board, row, col, piece)
+    # Only boards a real game can reach: the first piece is level or one ahead, and at
+    # most one side has a line, made by the last piece played
+    counts = {p: board.masks[p].bit_count() for p in (PLAYER_PIECE, AI_PIECE)}
+    if not 0 <= counts[first_piece] - counts[second_piece] <= 1:
+        raise ValueError(f"impossible piece counts: {counts[first_piece]} pieces for {first_piece}, "
+                         f"which moved first, and {counts[second_piece]} for {second_piece}")
+    piece = first_piece if counts[first_piece] == counts[second_piece] else second_piece
+    lines = [p for p in (PLAYER_PIECE, AI_PIECE)
+             if any(line & board.masks[p] == line for line in GEOMETRY.lines)]
+    if len(lines) == 2:
+        raise ValueError("both sides have a completed line")
+    if lines and lines[0] == piece:
+        raise ValueError(f"pieces were played after piece {lines[0]} completed a line")
+    if board.undo:
+        board.first = first_piece  # the array does not say which piece was dropped first
+    return board, piece
+
+# Analyze one position for analyze(); runs in worker processes when workers > 1. An
+# invalid position gives an error result instead of ending the batch.
+def _analyze_position(task):
+    index, position, depth, time_budget_ms, first_piece = task
+    start_time = time.time()
+    try:
+        board, piece = parse_position(position, first_piece)
+    except (ValueError, TypeError) as error:
+        return {"index": index, "error": str(error)}
+    maximizingPlayer = piece == AI_PIECE
+    if is_terminal_node(board):
+        _, score, nodes, _ = alpha_beta_ab(board, 0, -math.inf, math.inf, maximizingPlayer)
+        column, searched_depth = None, 0
+    elif depth is not None:
+        column, score, nodes, _ = alpha_beta_ab(board, depth, -math.inf, math.inf, maximizingPlayer)
+        searched_depth = depth
+    else:
+        column, score, nodes, _, info = iterative_deepening(board, time_budget_ms, maximizingPlayer)
+        searched_depth = info["depth"]
+    return {"index": index, "column": column, "score": score, "nodes": nodes, "depth": searched_depth,
+            "to_move": piece, "time_ms": (time.time() - start_time) * 1000}
+
+# Batch analysis: search every position (move string or board array) to a fixed depth
+# or within a time budget per position and yield one result dict per position, in
+# input order, as soon as it is ready. Scores are from AI_PIECE's point of view, like
+# alpha_beta_ab. Invalid positions yield {"index", "error"} and the batch goes on. The
+# transposition table stays warm across the batch.
+def analyze(positions, depth=None, time_budget_ms=None, first_piece=PLAYER_PIECE, workers=1):
+    if (depth is None) == (time_budget_ms is None):
+        raise ValueError("pass exactly one of depth or time_budget_ms")
+    tasks = ((index, position, depth, time_budget_ms, first_piece) for index, position in enumerate(positions))
+    if workers > 1:
+        with ProcessPoolExecutor(workers, initializer=configure, initargs=(GEOMETRY,)) as pool:
+            yield from pool.map(_analyze_position, tasks, chunksize=16)
+    else:
+        for task in tasks:
+            yield _analyze_position(task)
+
+
+# Command line batch analysis: move strings on stdin, one JSON result per line on stdout
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Analyze Connect 4 positions given as move strings on stdin.")
+    limit = parser.add_mutually_exclusive_group(required=True)
+    limit.add_argument("--depth", type=int, help="fixed search depth")
+    limit.add_argument("--time-budget-ms", type=float, help="thinking time per position")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes")
+    args = parser.parse_args()
+
+    positions = (line.strip() for line in sys.stdin if line.strip())
+    for result in analyze(positions, args.depth, args.time_budget_ms, workers=args.workers):
+        print(json.dumps(result), flush=True)
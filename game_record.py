@@ -0,0 +1,226 @@
+# Connect 4 game records
+# A compact, append-only file format for finished games. Moves take half a byte
+# each (two columns per byte); every game also stores who played it (algorithm,
+# search depth and time budget for both sides) and the nodes and time each move
+# cost. Writers append one game at a time and readers are generators, so files with
+# millions of games can be written and scanned without holding them in memory.
+#
+# File layout (little endian):
+#   header   magic b"C4GR", version (u16)
+#   games    one frame per game: body length (varint), then the body
+#
+# Game body:
+#   first piece (u8), result (u8: 0 unfinished, PLAYER_PIECE or AI_PIECE won, 3 draw)
+#   two players, first piece's side first: algorithm (u8 length + UTF-8), depth (u8,
+#   0 for none), time budget in ms (varint, 0 for none)
+#   opening plies (u8), move count (u8), moves packed two per byte (low nibble first)
+#   per move: nodes (varint), time in microseconds (varint)
+
+import struct
+import sys
+
+from engine import (PLAYER_PIECE, AI_PIECE, create_board, drop_piece, get_next_open_row, is_valid_location,
+                    winning_move, is_board_full)
+
+RECORD_MAGIC = b"C4GR"
+RECORD_VERSION = 1
+HEADER_FORMAT = "<4sH"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+RESULT_DRAW = 3
+
+# Default file the game appends to
+RECORDS_PATH = "games.c4g"
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+# Encode a game dict (see read_games for the keys) as a frame body
+def encode_game(game):
+    moves = game["moves"]
+    if len(moves) > 255:
+        raise ValueError("a game record holds at most 255 moves")
+    out = bytearray([game["first_piece"], game["result"]])
+    for algorithm, depth, time_budget_ms in game["players"]:
+        name = algorithm.encode()
+        out.append(len(name))
+        out += name
+        out.append(depth or 0)
+        _write_varint(out, int(time_budget_ms or 0))
+    out.append(game.get("opening_plies", 0))
+    out.append(len(moves))
+    for index in range(0, len(moves), 2):
+        pair = moves[index:index + 2]
+        out.append(pair[0] | (pair[1] << 4 if len(pair) == 2 else 0))
+    nodes = game.get("nodes") or [0] * len(moves)
+    times = game.get("time_ms") or [0] * len(moves)
+    for explored, time_ms in zip(nodes, times):
+        _write_varint(out, explored)
+        _write_varint(out, round(time_ms * 1000))
+    return bytes(out)
+
+
+# Decode a frame body back into a game dict
+def decode_game(data):
+    first_piece, result = data[0], data[1]
+    offset = 2
+    players = []
+    for _ in range(2):
+        length = data[offset]
+        algorithm = bytes(data[offset + 1:offset + 1 + length]).decode()
+        offset += 1 + length
+        depth = data[offset] or None
+        time_budget_ms, offset = _read_varint(data, offset + 1)
+        players.append((algorithm, depth, time_budget_ms or None))
+    opening_plies, count = data[offset], data[offset + 1]
+    offset += 2
+    moves = []
+    for index in range(count):
+        byte = data[offset + index // 2]
+        moves.append(byte >> 4 if index % 2 else byte & 0x0f)
+    offset += (count + 1) // 2
+    nodes = []
+    times = []
+    for _ in range(count):
+        explored, offset = _read_varint(data, offset)
+        time_us, offset = _read_varint(data, offset)
+        nodes.append(explored)
+        times.append(time_us / 1000)
+    return {"first_piece": first_piece, "result": result, "players": players, "opening_plies": opening_plies,
+            "moves": moves, "nodes": nodes, "time_ms": times}
+
+
+# Append-only writer. Opening an existing file adds games to the end of it.
+class GameWriter:
+    def __init__(self, path=RECORDS_PATH):
+        self.path = path
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(struct.pack(HEADER_FORMAT, RECORD_MAGIC, RECORD_VERSION))
+        self.games = 0
+
+    # Game dict keys: first_piece, result, players as two (algorithm, depth,
+    # time_budget_ms) tuples, moves, and optionally opening_plies and per-move
+    # nodes and time_ms
+    def write(self, game):
+        body = encode_game(game)
+        frame = bytearray()
+        _write_varint(frame, len(body))
+        self.file.write(frame + body)
+        self.games += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+# Yield the games in a record file one at a time, reading the file in chunks
+def read_games(path=RECORDS_PATH, chunk_size=1 << 20):
+    with open(path, "rb") as records:
+        header = records.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            raise ValueError(f"{path} is not a game record file")
+        magic, version = struct.unpack(HEADER_FORMAT, header)
+        if magic != RECORD_MAGIC or version != RECORD_VERSION:
+            raise ValueError(f"{path} is not a version {RECORD_VERSION} game record file")
+        buffer = b""
+        offset = 0
+        while True:
+            # A complete frame needs its length prefix (at most 3 bytes) and body
+            try:
+                length, start = _read_varint(buffer, offset)
+                complete = start + length <= len(buffer)
+            except IndexError:
+                complete = False
+            if not complete:
+                chunk = records.read(chunk_size)
+                if not chunk:
+                    if offset < len(buffer):
+                        raise ValueError(f"{path} ends with a truncated game")
+                    return
+                buffer = buffer[offset:] + chunk
+                offset = 0
+                continue
+            yield decode_game(memoryview(buffer)[start:start + length])
+            offset = start + length
+
+
+# Result code for a finished board, for the result field of a game
+def game_result(board):
+    if winning_move(board, PLAYER_PIECE):
+        return PLAYER_PIECE
+    if winning_move(board, AI_PIECE):
+        return AI_PIECE
+    if is_board_full(board):
+        return RESULT_DRAW
+    return 0
+
+
+# Replay a game move by move, yielding (board, col, piece) after every move. The same
+# board object is updated in place.
+def replay(game):
+    board = create_board()
+    piece = game["first_piece"]
+    for col in game["moves"]:
+        if not is_valid_location(board, col):
+            raise ValueError(f"column {col} is full")
+        drop_piece(board, get_next_open_row(board, col), col, piece)
+        yield board, col, piece
+        piece = AI_PIECE if piece == PLAYER_PIECE else PLAYER_PIECE
+
+
+# The board at the end of a game
+def final_board(game):
+    board = create_board()
+    for board, _, _ in replay(game):
+        pass
+    return board
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import time
+
+    parser = argparse.ArgumentParser(description="Read a Connect 4 game record file.")
+    parser.add_argument("path", nargs="?", default=RECORDS_PATH, help="game record file")
+    parser.add_argument("--json", action="store_true", help="print every game as a JSON line")
+    parser.add_argument("--verify", action="store_true", help="replay every game and check its result")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    games = moves = mismatches = 0
+    results = {0: 0, PLAYER_PIECE: 0, AI_PIECE: 0, RESULT_DRAW: 0}
+    for game in read_games(args.path):
+        games += 1
+        moves += len(game["moves"])
+        results[game["result"]] += 1
+        if args.verify and game_result(final_board(game)) != game["result"]:
+            mismatches += 1
+        if args.json:
+            print(json.dumps(game))
+    elapsed_time = time.time() - start_time
+    print(f"{games} games, {moves} moves: {results[PLAYER_PIECE]} player wins, {results[AI_PIECE]} AI wins, "
+          f"{results[RESULT_DRAW]} draws, {results[0]} unfinished ({elapsed_time:.2f} s)", file=sys.stderr)
+    if args.verify:
+        print(f"{mismatches} games do not replay to their recorded result", file=sys.stderr)
+        if mismatches:
+            sys.exit(1)
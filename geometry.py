@@ -0,0 +1,91 @@
+# Connect 4 board geometry
+# Everything about the board's shape that the engine precomputes: the bitboard
+# masks, every winning line as a bitmask, the lines through each cell, the window
+# start masks used by the evaluation and the center-out column order. One Geometry
+# is built per board size and line length (the standard game is 6 rows, 7 columns,
+# four in a row); engine.configure() switches the engine to another one.
+#
+# Bitboard layout: each column takes rows + 1 bits, bit (c * column_height + r) is
+# the cell at row r, column c. The extra bit on top of every column is always empty
+# so that shifted lines never wrap into the neighbouring column.
+
+# (row step, column step) for the four line directions: vertical, horizontal and
+# both diagonals, in the same order as Geometry.line_shifts
+LINE_STEPS = ((1, 0), (0, 1), (1, 1), (-1, 1))
+
+
+class Geometry:
+    def __init__(self, rows=6, columns=7, connect=4):
+        if rows < 1 or columns < 1 or connect < 2:
+            raise ValueError(f"invalid geometry: {rows} rows, {columns} columns, connect {connect}")
+        if columns > 16:
+            raise ValueError("at most 16 columns are supported")  # game records pack a column into 4 bits
+        self.rows = rows
+        self.columns = columns
+        self.connect = connect
+        self.column_height = rows + 1
+        self.cells = rows * columns
+        self.bits = columns * self.column_height
+        self.bottom_mask = sum(1 << (c * self.column_height) for c in range(columns))
+        self.top_mask = self.bottom_mask << (rows - 1)
+        self.board_mask = self.bottom_mask * ((1 << rows) - 1)
+        self.column_bits = (1 << self.column_height) - 1
+
+        # Shift distances for the directions in LINE_STEPS
+        self.line_shifts = (1, self.column_height, self.column_height + 1, self.column_height - 1)
+
+        # Window starts for each direction: bit x is set when the connect cells x,
+        # x + shift, x + 2 * shift, ... all lie on the board
+        self.window_starts = tuple(
+            sum(1 << self.index(r, c)
+                for c in range(columns) for r in range(rows)
+                if 0 <= r + (connect - 1) * dr < rows and c + (connect - 1) * dc < columns)
+            for dr, dc in LINE_STEPS)
+
+        # Every winning line as a mask, and for each bit index the lines through it
+        self.lines = []
+        for shift, starts in zip(self.line_shifts, self.window_starts):
+            line = sum(1 << (k * shift) for k in range(connect))
+            for start in range(self.bits):
+                if starts >> start & 1:
+                    self.lines.append(line << start)
+        cell_lines = [[] for _ in range(self.bits)]
+        for line in self.lines:
+            for index in range(self.bits):
+                if line >> index & 1:
+                    cell_lines[index].append(line)
+        self.cell_lines = tuple(tuple(lines) for lines in cell_lines)
+
+        # The center column, or the two middle columns on an even-width board, so the
+        # evaluation stays left-right symmetric
+        center_columns = {(columns - 1) // 2, columns // 2}
+        self.center_mask = sum(((1 << rows) - 1) << (c * self.column_height) for c in center_columns)
+        self.center_order = sorted(range(columns), key=lambda c: abs(2 * c - (columns - 1)))
+
+        # Cells on odd rows (1, 3, 5, ... counting from 1 at the bottom) and on even rows,
+        # for the threat parity in the evaluation
+        self.odd_rows_mask = sum(self.bottom_mask << r for r in range(0, rows, 2))
+        self.even_rows_mask = sum(self.bottom_mask << r for r in range(1, rows, 2))
+
+    def index(self, row, col):
+        return col * self.column_height + row
+
+    def __repr__(self):
+        return f"Geometry(rows={self.rows}, columns={self.columns}, connect={self.connect})"
+
+    def __eq__(self, other):
+        return (isinstance(other, Geometry) and
+                (self.rows, self.columns, self.connect) == (other.rows, other.columns, other.connect))
+
+    def __hash__(self):
+        return hash((self.rows, self.columns, self.connect))
+
+
+# Parse a variant name like "7x6" (columns x rows) or "9x7x5" (with the line length)
+def parse_geometry(name):
+    parts = name.lower().split("x")
+    if len(parts) not in (2, 3) or not all(part.isdigit() for part in parts):
+        raise ValueError(f"expected COLUMNSxROWS or COLUMNSxROWSxCONNECT, got {name!r}")
+    columns, rows = int(parts[0]), int(parts[1])
+    connect = int(parts[2]) if len(parts) == 3 else 4
+    return Geometry(rows, columns, connect)
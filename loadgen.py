@@ -0,0 +1,193 @@
+# Connect 4 analysis server load generator
+# Plays many games against server.py at once to measure it under concurrent load.
+# Every client keeps one keep-alive connection and plays games one after another:
+# random moves for PLAYER_PIECE, and the server's move for AI_PIECE. Reports the
+# throughput and the p50/p90/p99 move latency seen by the clients, next to the
+# server's own metrics.
+#
+#     python server.py --port 8765 --workers 4 &
+#     python loadgen.py --port 8765 --clients 32 --duration 30
+#     python loadgen.py --spawn 4 --clients 32 --duration 30   # starts its own server
+#     python loadgen.py --spawn 4 --geometry 10x8                # any board the server accepts
+#
+# Positions are sent as board arrays rather than move strings, so boards wider than
+# nine columns work too.
+
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import engine
+from engine import EMPTY, PLAYER_PIECE, AI_PIECE, create_board, drop_piece, get_next_open_row, get_valid_locations
+from geometry import parse_geometry
+from server import DEFAULT_PORT, percentile
+
+
+# One HTTP/1.1 request on an open keep-alive connection. Returns (status, JSON body).
+async def http_request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("server closed the connection")
+    status = int(status_line.split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def open_connection(host, port, unix_path):
+    if unix_path is not None:
+        return await asyncio.open_unix_connection(unix_path)
+    return await asyncio.open_connection(host, port)
+
+
+# Play games until the stop time, appending one latency (ms) per server move
+async def run_client(client, host, port, unix_path, stop_time, time_budget_ms, depth, seed, latencies, counts):
+    rng = random.Random(seed * 1000003 + client)
+    reader, writer = await open_connection(host, port, unix_path)
+    try:
+        while time.time() < stop_time:
+            board = create_board()
+            piece = rng.choice((PLAYER_PIECE, AI_PIECE))
+            first_piece = piece
+            while board.winner == EMPTY and get_valid_locations(board) and time.time() < stop_time:
+                if piece == PLAYER_PIECE:
+                    col = rng.choice(get_valid_locations(board))
+                else:
+                    position = [board[row] for row in range(engine.ROW_COUNT)]
+                    request = {"position": position, "first_piece": first_piece, "time_budget_ms": time_budget_ms}
+                    if depth is not None:
+                        request["depth"] = depth
+                    start_time = time.perf_counter()
+                    status, result = await http_request(reader, writer, "POST", "/move", request)
+                    latencies.append((time.perf_counter() - start_time) * 1000)
+                    if status != 200 or result["column"] is None:
+                        counts["errors"] += 1
+                        break
+                    col = result["column"]
+                    counts["nodes"] += result["nodes"]
+                drop_piece(board, get_next_open_row(board, col), col, piece)
+                piece = AI_PIECE if piece == PLAYER_PIECE else PLAYER_PIECE
+            counts["games"] += 1
+    finally:
+        writer.close()
+
+
+async def fetch_metrics(host, port, unix_path):
+    reader, writer = await open_connection(host, port, unix_path)
+    try:
+        return (await http_request(reader, writer, "GET", "/metrics"))[1]
+    finally:
+        writer.close()
+
+
+# Wait for a freshly started server to answer /health
+async def wait_until_ready(host, port, unix_path, timeout_s=30):
+    give_up = time.time() + timeout_s
+    while True:
+        try:
+            reader, writer = await open_connection(host, port, unix_path)
+        except OSError:
+            if time.time() > give_up:
+                raise
+            await asyncio.sleep(0.1)
+            continue
+        try:
+            await http_request(reader, writer, "GET", "/health")
+            return
+        finally:
+            writer.close()
+
+
+async def run_load(host="127.0.0.1", port=DEFAULT_PORT, unix_path=None, clients=16, duration_s=10,
+                   time_budget_ms=100, depth=None, seed=1):
+    latencies = []
+    counts = {"games": 0, "errors": 0, "nodes": 0}
+    start_time = time.time()
+    await asyncio.gather(*(run_client(client, host, port, unix_path, start_time + duration_s, time_budget_ms, depth,
+                                      seed, latencies, counts)
+                           for client in range(clients)))
+    elapsed_time = time.time() - start_time
+    return {"clients": clients, "duration_s": elapsed_time, "requests": len(latencies), **counts,
+            "throughput_rps": len(latencies) / elapsed_time,
+            "latency_ms": {"mean": sum(latencies) / len(latencies) if latencies else None,
+                           "p50": percentile(latencies, 0.5), "p90": percentile(latencies, 0.9),
+                           "p99": percentile(latencies, 0.99), "max": max(latencies) if latencies else None},
+            "server": await fetch_metrics(host, port, unix_path)}
+
+
+def print_report(report):
+    def ms(value):
+        return f"{value:.1f}" if value is not None else "-"
+
+    latency = report["latency_ms"]
+    server = report["server"]
+    print(f"{report['requests']} moves in {report['games']} games from {report['clients']} clients "
+          f"in {report['duration_s']:.1f} s, {report['errors']} errors")
+    print(f"throughput {report['throughput_rps']:.1f} moves/s")
+    print(f"move latency ms  p50 {ms(latency['p50'])}  p90 {ms(latency['p90'])}  p99 {ms(latency['p99'])}  "
+          f"max {ms(latency['max'])}")
+    print(f"server: queue ms p50 {ms(server['queue_ms']['p50'])} p99 {ms(server['queue_ms']['p99'])}, "
+          f"search ms p50 {ms(server['search_ms']['p50'])} p99 {ms(server['search_ms']['p99'])}, "
+          f"mean batch {ms(server['batches']['mean_size'])}, {server['workers']} workers")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load test a Connect 4 analysis server.")
+    parser.add_argument("--host", default="127.0.0.1", help="server address")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="server port")
+    parser.add_argument("--unix", help="connect to this Unix socket instead")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent games")
+    parser.add_argument("--duration", type=float, default=10, help="seconds to run")
+    parser.add_argument("--time-budget-ms", type=float, default=100, help="thinking time per move")
+    parser.add_argument("--depth", type=int, default=None, help="depth limit per move")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the clients' moves")
+    parser.add_argument("--geometry", help="board variant the server plays, as COLUMNSxROWS or COLUMNSxROWSxCONNECT")
+    parser.add_argument("--spawn", type=int, metavar="WORKERS",
+                        help="start a server with this many workers for the run")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args()
+    if args.geometry:
+        try:
+            engine.configure(parse_geometry(args.geometry))
+        except ValueError as error:
+            parser.error(str(error))
+
+    spawned = None
+    if args.spawn:
+        server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+        command = [sys.executable, server_path, "--host", args.host, "--port", str(args.port),
+                   "--workers", str(args.spawn)]
+        if args.unix:
+            command += ["--unix", args.unix]
+        if args.geometry:
+            command += ["--geometry", args.geometry]
+        spawned = subprocess.Popen(command)
+    try:
+        if spawned is not None:
+            asyncio.run(wait_until_ready(args.host, args.port, args.unix))
+        report = asyncio.run(run_load(args.host, args.port, args.unix, args.clients, args.duration,
+                                      args.time_budget_ms, args.depth, args.seed))
+    finally:
+        if spawned is not None:
+            spawned.terminate()
+            spawned.wait()
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
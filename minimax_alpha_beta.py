@@ -3,12 +3,20 @@
 # This program implements minimax and alpha beta pruning to
 # be able to compete against user in a game of Connect 4
 
-import numpy as np
 import random
 import pygame
 import sys
+import os
 import time
 import math
+import threading
+import traceback
+
+from engine import (ROW_COUNT, COLUMN_COUNT, PLAYER_PIECE, AI_PIECE, create_board, drop_piece, is_valid_location,
+                    get_next_open_row, winning_move, is_terminal_node, minimax, alpha_beta_ab, iterative_deepening,
+                    transposition_table, move_ordering, Ponderer, SearchTimeout, pick_best_move)
+from opening_book import BOOK_PATH, load_book
+from game_record import RECORDS_PATH, GameWriter, game_result
 
 # Constants for colors
 BLUE = (0, 0, 255)
@@ -16,243 +24,23 @@ BLACK = (0, 0, 0)
 RED = (255, 0, 0)
 YELLOW = (255, 255, 0)
 
-# Board dimensions
-ROW_COUNT = 6
-COLUMN_COUNT = 7
-
-# Players and pieces
+# Players
 PLAYER = 0
 AI = 1
-EMPTY = 0
-PLAYER_PIECE = 1
-AI_PIECE = 2
-
-# Winning conditions
-WINDOW_LENGTH = 4
-
-# Initialize the game board with zeros
-def create_board():
-    board = np.zeros((ROW_COUNT, COLUMN_COUNT))
-    return board
-
-# Drop a piece into the specified column
-def drop_piece(board, row, col, piece):
-    board[row][col] = piece
-
-# Check if a location in a column is a valid move
-def is_valid_location(board, col):
-    return board[ROW_COUNT - 1][col] == 0
-
-# Get the next open row in a column
-def get_next_open_row(board, col):
-    for r in range(ROW_COUNT):
-        if board[r][col] == 0:
-            return r
-
-# Check if the board is full
-def is_board_full(board):
-    return all(board[ROW_COUNT - 1][col] != 0 for col in range(COLUMN_COUNT))
-
-# Check if a player has a winning move on the board
-def winning_move(board, piece):
-    # Check horizontally
-    for c in range(COLUMN_COUNT - 3):
-        for r in range(ROW_COUNT):
-            if board[r][c] == piece and board[r][c + 1] == piece and board[r][c + 2] == piece and board[r][c + 3] == piece:
-                return True
-    # Check vertically
-    for c in range(COLUMN_COUNT):
-        for r in range(ROW_COUNT - 3):
-            if board[r][c] == piece and board[r + 1][c] == piece and board[r + 2][c] == piece and board[r + 3][c] == piece:
-                return True
-    # Check diagonally (from bottom-left to top-right)
-    for c in range(COLUMN_COUNT - 3):
-        for r in range(ROW_COUNT - 3):
-            if board[r][c] == piece and board[r + 1][c + 1] == piece and board[r + 2][c + 2] == piece and board[r + 3][c + 3] == piece:
-                return True
-    # Check diagonally (from top-left to bottom-right)
-    for c in range(COLUMN_COUNT - 3):
-        for r in range(3, ROW_COUNT):
-            if board[r][c] == piece and board[r - 1][c + 1] == piece and board[r - 2][c + 2] == piece and board[r - 3][c + 3] == piece:
-                return True
-
-# Evaluate the score of a window for a specific player
-def evaluate_window(window, piece):
-    score = 0
-    opp_piece = PLAYER_PIECE
-    if piece == PLAYER_PIECE:
-        opp_piece = AI_PIECE
-
-    if window.count(piece) == 4:
-        score += 100
-    elif window.count(piece) == 3 and window.count(EMPTY) == 1:
-        score += 5
-    elif window.count(piece) == 2 and window.count(EMPTY) == 2:
-        score += 2
-
-    if window.count(opp_piece) == 3 and window.count(EMPTY) == 1:
-        score -= 4
-
-    return score
-
-# Score the position of the board for a specific player
-def score_position(board, piece):
-    score = 0
-
-    center_array = [int(i) for i in list(board[:, COLUMN_COUNT // 2])]
-    center_count = center_array.count(piece)
-    score += center_count * 3
-
-    for r in range(ROW_COUNT):
-        row_array = [int(i) for i in list(board[r, :])]
-        for c in range(COLUMN_COUNT - 3):
-            window = row_array[c:c + WINDOW_LENGTH]
-            score += evaluate_window(window, piece)
 
-    for c in range(COLUMN_COUNT):
-        col_array = [int(i) for i in list(board[:, c])]
-        for r in range(ROW_COUNT - 3):
-            window = col_array[r:r + WINDOW_LENGTH]
-            score += evaluate_window(window, piece)
-
-    for r in range(ROW_COUNT - 3):
-        for c in range(COLUMN_COUNT - 3):
-            window = [board[r + i][c + i] for i in range(WINDOW_LENGTH)]
-            score += evaluate_window(window, piece)
-
-    for r in range(ROW_COUNT - 3):
-        for c in range(COLUMN_COUNT - 3):
-            window = [board[r + 3 - i][c + i] for i in range(WINDOW_LENGTH)]
-            score += evaluate_window(window, piece)
-
-    return score
-
-# Check if the current board state is a terminal node
-def is_terminal_node(board):
-    return winning_move(board, PLAYER_PIECE) or winning_move(board, AI_PIECE) or len(get_valid_locations(board)) == 0
-
-# Minimax algorithm
-def minimax(board, depth, maximizingPlayer):
-    valid_locations = get_valid_locations(board)
-    is_terminal = is_terminal_node(board)
-    start_time = time.time()
-    nodes_explored = 0  # Initialize nodes_explored
-
-    if depth == 0 or is_terminal:
-        if is_terminal:
-            if winning_move(board, AI_PIECE):
-                return None, 100000000000000, nodes_explored, 0
-            elif winning_move(board, PLAYER_PIECE):
-                return None, -10000000000000, nodes_explored, 0
-            else:
-                return None, 0, nodes_explored, 0
-        else:
-            return None, score_position(board, AI_PIECE), nodes_explored, 0
-
-    if maximizingPlayer:
-        best_value = -math.inf
-        column = random.choice(valid_locations)
-        for col in valid_locations:
-            row = get_next_open_row(board, col)
-            b_copy = board.copy()
-            drop_piece(b_copy, row, col, AI_PIECE)
-            _, new_score, explored, _ = minimax(b_copy, depth - 1, False)
-            nodes_explored += 1  # Increment nodes_explored for each explored node
-            if new_score > best_value:
-                best_value = new_score
-                column = col
-    else:
-        best_value = math.inf
-        column = random.choice(valid_locations)
-        for col in valid_locations:
-            row = get_next_open_row(board, col)
-            b_copy = board.copy()
-            drop_piece(b_copy, row, col, PLAYER_PIECE)
-            _, new_score, explored, _ = minimax(b_copy, depth - 1, True)
-            nodes_explored += 1  # Increment nodes_explored for each explored node
-            if new_score < best_value:
-                best_value = new_score
-                column = col
-
-    end_time = time.time()
-    elapsed_time = (end_time - start_time) * 1000  # in milliseconds
-    return column, best_value, nodes_explored, elapsed_time
-
-# Alpha-beta pruning version of the minimax algorithm
-def alpha_beta_ab(board, depth, alpha, beta, maximizingPlayer):
-    valid_locations = get_valid_locations(board)
-    is_terminal = is_terminal_node(board)
-    start_time = time.time()
-    nodes_explored = 0  # Initialize nodes_explored
-
-    if depth == 0 or is_terminal:
-        if is_terminal:
-            if winning_move(board, AI_PIECE):
-                return None, 100000000000000, nodes_explored, 0
-            elif winning_move(board, PLAYER_PIECE):
-                return None, -10000000000000, nodes_explored, 0
-            else:
-                return None, 0, nodes_explored, 0
-        else:
-            return None, score_position(board, AI_PIECE), nodes_explored, 0
-
-    if maximizingPlayer:
-        value = -math.inf
-        column = random.choice(valid_locations)
-        for col in valid_locations:
-            row = get_next_open_row(board, col)
-            b_copy = board.copy()
-            drop_piece(b_copy, row, col, AI_PIECE)
-            _, new_score, explored, _ = alpha_beta_ab(b_copy, depth - 1, alpha, beta, False)
-            nodes_explored += 1  # Increment nodes_explored for each explored node
-            if new_score > value:
-                value = new_score
-                column = col
-            alpha = max(alpha, value)
-            if alpha >= beta:
-                break
-    else:
-        value = math.inf
-        column = random.choice(valid_locations)
-        for col in valid_locations:
-            row = get_next_open_row(board, col)
-            b_copy = board.copy()
-            drop_piece(b_copy, row, col, PLAYER_PIECE)
-            _, new_score, explored, _ = alpha_beta_ab(b_copy, depth - 1, alpha, beta, True)
-            nodes_explored += 1  # Increment nodes_explored for each explored node
-            if new_score < value:
-                value = new_score
-                column = col
-            beta = min(beta, value)
-            if alpha >= beta:
-                break
-
-    end_time = time.time()
-    elapsed_time = (end_time - start_time) * 1000  # in milliseconds
-    return column, value, nodes_explored, elapsed_time
-
-# Get valid locations for a move on the current board
-def get_valid_locations(board):
-    valid_locations = []
-    for col in range(COLUMN_COUNT):
-        if is_valid_location(board, col):
-            valid_locations.append(col)
-    return valid_locations
-
-# Choose the best move for the AI player
-def pick_best_move(board, piece):
-    valid_locations = get_valid_locations(board)
-    best_score = -10000
-    best_col = random.choice(valid_locations)
-    for col in valid_locations:
-        row = get_next_open_row(board, col)
-        temp_board = board.copy()
-        drop_piece(temp_board, row, col, piece)
-        score = score_position(temp_board, piece)
-        if score > best_score:
-            best_score = score
-            best_col = col
-    return best_col
+# Thinking time per move for the alpha-beta AI (iterative deepening), in milliseconds
+AI_TIME_BUDGET_MS = 1000
+
+# Worker processes for the alpha-beta AI; more than one splits the root moves
+# across a process pool (see parallel_search)
+AI_SEARCH_WORKERS = 1
+
+# Let the alpha-beta AI search its replies while the player is thinking
+AI_PONDER = True
+
+# Finished and abandoned games are appended to this file (see game_record.py); None
+# turns recording off
+GAME_RECORDS_PATH = RECORDS_PATH
 
 # Draw the game board
 def draw_board(board):
@@ -313,50 +101,25 @@ def draw_hover_button(button, hover_color, text, text_color):
 
     return button, hover_color  # Update the color variable
 
-# Initialize Pygame
-pygame.init()
-
-# Set up game parameters
-SQUARESIZE = 100
-width = (COLUMN_COUNT + 3) * SQUARESIZE
-height = (ROW_COUNT + 2) * SQUARESIZE
-size = (width, height)
-RADIUS = int(SQUARESIZE / 2 - 5)
-
-# Set up the game window
-screen = pygame.display.set_mode(size)
-myfont = pygame.font.SysFont("monospace", 75)
-
-# Create buttons for new game, restart, and exit
-new_game_button = create_button(COLUMN_COUNT * SQUARESIZE + 30, 50, 200, 50, (0, 255, 0), "New Game", (0, 0, 0))
-restart_game_button = create_button(COLUMN_COUNT * SQUARESIZE + 30, 120, 200, 50, (255, 255, 0), "Restart", (0, 0, 0))
-exit_button = create_button(COLUMN_COUNT * SQUARESIZE + 30, 190, 200, 50, (255, 0, 0), "Exit", (0, 0, 0))
-
-# Create the game board
-board = create_board()
-game_over = False
-turn = random.randint(PLAYER, AI)
-
-# Create buttons for choosing the algorithm
-minimax_radio_button = create_button(COLUMN_COUNT * SQUARESIZE + 30, 260, 200, 50, (255, 182, 193), "Minimax",
-                                     (0, 0, 0))
-alphabeta_radio_button = create_button(COLUMN_COUNT * SQUARESIZE + 30, 330, 200, 50, (173, 216, 230), "Alpha-Beta",
-                                       (0, 0, 0))
-
-# Set initial colors for algorithm buttons
-minimax_radio_button_color = (255, 182, 193)
-alphabeta_radio_button_color = (173, 216, 230)
-
-# Set the current algorithm to minimax
-current_algorithm = minimax
-
 # Draw information on the surface
-def draw_info(elapsed_time, nodes_explored):
+def draw_info(elapsed_time, nodes_explored, tt_stats=None, search_depth=None, ebf=None, ponder_stats=None):
     font = pygame.font.SysFont("monospace", 20)
     elapsed_time_text = font.render(f"Time: {elapsed_time:.3f} ms", True, (255, 255, 255))
-    nodes_explored_text = font.render(f"Nodes Explored: {nodes_explored}", True, (255, 255, 255))
+    nodes_text = f"Nodes Explored: {nodes_explored}"
+    if search_depth is not None:
+        nodes_text += f"  Depth: {search_depth}"
+    if ebf is not None:
+        nodes_text += f"  EBF: {ebf:.2f}"
+    nodes_explored_text = font.render(nodes_text, True, (255, 255, 255))
     screen.blit(elapsed_time_text, (width // 2 - 70, height - 70))
     screen.blit(nodes_explored_text, (width // 2 - 70, height - 40))
+    if tt_stats is not None:
+        text = f"TT hits: {tt_stats['hits']} misses: {tt_stats['misses']} cutoffs: {tt_stats['cutoffs']}"
+        if ponder_stats is not None:
+            text += (f"  Ponder hits: {ponder_stats['hits']}/{ponder_stats['hits'] + ponder_stats['misses']} "
+                     f"saved: {ponder_stats['last_saved_ms']:.0f} ms")
+        tt_text = font.render(text, True, (255, 255, 255))
+        screen.blit(tt_text, (width // 2 - 70, height - 95))
 
 
 # Function to clear the banner
@@ -364,159 +127,382 @@ def clear_banner():
     pygame.draw.rect(screen, BLACK, (0, 0, width, SQUARESIZE))
     pygame.display.update()
 
-# Main game loop
-while True:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            sys.exit()
-
-        if event.type == pygame.MOUSEMOTION:
-            # Handle mouse motion events for button hover effect
-            if new_game_button.collidepoint(event.pos):
-                draw_hover_button(new_game_button, (50, 205, 50), "New Game", (0, 0, 0))
+# Draw what the AI has found so far while it is still thinking
+def draw_progress(ai_search):
+    pygame.draw.rect(screen, BLACK, (0, height - 95, width, 95))
+    font = pygame.font.SysFont("monospace", 20)
+    elapsed_time = (time.time() - ai_search.start_time) * 1000
+    text = f"Thinking... {elapsed_time:.0f} ms"
+    if ai_search.progress is not None:
+        progress = ai_search.progress
+        text += f"  Depth: {progress['depth']}  Best: {progress['column'] + 1}  Nodes: {progress['nodes']}"
+    screen.blit(font.render(text, True, (255, 255, 255)), (width // 2 - 70, height - 70))
+
+
+# Runs the AI's search on a background thread so the window keeps handling events.
+# progress holds the last completed iteration while it thinks, result the finished
+# (col, score, nodes, elapsed_time, search_info) tuple, and error the exception if the
+# search failed, in which case result holds a quick fallback move. cancel() stops the
+# search and waits for the thread, so the shared tables are quiet before another
+# search starts; its result is never used.
+class AISearch:
+    def __init__(self, board, algorithm, time_budget_ms=AI_TIME_BUDGET_MS):
+        self.board = board.copy()
+        self.algorithm = algorithm
+        self.time_budget_ms = time_budget_ms
+        self.stop = threading.Event()
+        self.start_time = time.time()
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            if self.algorithm == minimax:
+                col, score, nodes_explored, elapsed_time = minimax(self.board, 4, True, self.stop)
+                result = (col, score, nodes_explored, elapsed_time, None)
             else:
-                draw_button(new_game_button, (0, 255, 0), "New Game", (255, 255, 255))
+                transposition_table.reset_stats()
+                move_ordering.reset_stats()
+                result = iterative_deepening(self.board, self.time_budget_ms, workers=AI_SEARCH_WORKERS,
+                                             stop=self.stop, progress=self.on_progress)
+        except SearchTimeout:
+            return  # cancelled
+        except Exception as error:
+            traceback.print_exc()
+            self.error = error
+            # Still make a legal move so the turns keep alternating
+            col = pick_best_move(self.board, AI_PIECE)
+            result = (col, 0, 0, time.time() - self.start_time, None)
+        if not self.stop.is_set():
+            self.result = result
+
+    def on_progress(self, iteration):
+        self.progress = iteration
+
+    def cancel(self):
+        self.stop.set()
+        self.thread.join()
+
+
+# Runs ponderer.ponder() on a background thread while it is the player's turn.
+# finish() stops it and waits, so the shared tables are quiet before the AI searches.
+class PonderThread:
+    def __init__(self, board, useful_depth=None):
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=ponderer.ponder, args=(board.copy(), self.stop, useful_depth),
+                                       daemon=True)
+        self.thread.start()
+
+    def finish(self):
+        self.stop.set()
+        self.thread.join()
+
+
+# Moves of the current game, saved to GAME_RECORDS_PATH when the game ends or is
+# abandoned. ai_player is the (algorithm, depth, time_budget_ms) of the AI's last move.
+class GameLog:
+    def __init__(self, turn):
+        self.first_piece = PLAYER_PIECE if turn == PLAYER else AI_PIECE
+        self.moves = []
+        self.nodes = []
+        self.times = []
+        self.ai_player = ("minimax", 4, None)
+        self.saved = False
+
+    def add(self, col, nodes=0, time_ms=0.0):
+        self.moves.append(col)
+        self.nodes.append(nodes)
+        self.times.append(time_ms)
+
+    def save(self, board):
+        if self.saved or not self.moves or GAME_RECORDS_PATH is None:
+            return
+        self.saved = True
+        human = ("human", None, None)
+        players = [human, self.ai_player] if self.first_piece == PLAYER_PIECE else [self.ai_player, human]
+        writer = GameWriter(GAME_RECORDS_PATH)
+        try:
+            writer.write({"first_piece": self.first_piece, "result": game_result(board), "players": players,
+                          "moves": self.moves, "nodes": self.nodes, "time_ms": self.times})
+        finally:
+            writer.close()
 
-            if restart_game_button.collidepoint(event.pos):
-                draw_hover_button(restart_game_button, (255, 255, 0), "Restart", (0, 0, 0))
-            else:
-                draw_button(restart_game_button, (255, 255, 0), "Restart", (210, 210, 210))
 
-            if exit_button.collidepoint(event.pos):
-                draw_hover_button(exit_button, (255, 0, 0), "Exit", (0, 0, 0))
-            else:
-                draw_button(exit_button, (255, 0, 0), "Exit", (255, 255, 255))
+# Set up game parameters
+SQUARESIZE = 100
+width = (COLUMN_COUNT + 3) * SQUARESIZE
+height = (ROW_COUNT + 2) * SQUARESIZE
+size = (width, height)
+RADIUS = int(SQUARESIZE / 2 - 5)
 
-            if minimax_radio_button.collidepoint(event.pos):
-                draw_hover_button(minimax_radio_button, (255, 218, 185), "Minimax", (0, 0, 0))
-            else:
-                draw_button(minimax_radio_button, minimax_radio_button_color, "Minimax", (255, 255, 255))
+# Searches the AI's replies during the player's turn and tracks how much time that saved
+ponderer = Ponderer()
+
+if __name__ == "__main__":
+    # Initialize Pygame
+    pygame.init()
+
+    # Use the opening book if one has been built (python opening_book.py)
+    if os.path.exists(BOOK_PATH):
+        load_book(BOOK_PATH)
+
+    # Set up the game window
+    screen = pygame.display.set_mode(size)
+    myfont = pygame.font.SysFont("monospace", 75)
+
+    # Create buttons for new game, restart, and exit
+    new_game_button = create_button(COLUMN_COUNT * SQUARESIZE + 30, 50, 200, 50, (0, 255, 0), "New Game", (0, 0, 0))
+    restart_game_button = create_button(COLUMN_COUNT * SQUARESIZE + 30, 120, 200, 50, (255, 255, 0), "Restart",
+                                        (0, 0, 0))
+    exit_button = create_button(COLUMN_COUNT * SQUARESIZE + 30, 190, 200, 50, (255, 0, 0), "Exit", (0, 0, 0))
+
+    # Create the game board
+    board = create_board()
+    game_over = False
+    turn = random.randint(PLAYER, AI)
+    game_log = GameLog(turn)
+
+    # Create buttons for choosing the algorithm
+    minimax_radio_button = create_button(COLUMN_COUNT * SQUARESIZE + 30, 260, 200, 50, (255, 182, 193), "Minimax",
+                                         (0, 0, 0))
+    alphabeta_radio_button = create_button(COLUMN_COUNT * SQUARESIZE + 30, 330, 200, 50, (173, 216, 230), "Alpha-Beta",
+                                           (0, 0, 0))
+
+    # Set initial colors for algorithm buttons
+    minimax_radio_button_color = (255, 182, 193)
+    alphabeta_radio_button_color = (173, 216, 230)
+
+    # The algorithm for the AI's moves, switched by the algorithm buttons
+    current_algorithm = minimax
+
+    # Background search for the AI's move, None while the AI is not thinking
+    ai_search = None
+    # Pondering thread, None unless the AI is searching during the player's turn
+    ponder = None
+    ai_time_budget = AI_TIME_BUDGET_MS
+    clock = pygame.time.Clock()
+
+    # Main game loop
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                if ai_search is not None:
+                    ai_search.cancel()
+                if ponder is not None:
+                    ponder.finish()
+                game_log.save(board)
+                sys.exit()
+
+            if event.type == pygame.MOUSEMOTION:
+                # Handle mouse motion events for button hover effect
+                if new_game_button.collidepoint(event.pos):
+                    draw_hover_button(new_game_button, (50, 205, 50), "New Game", (0, 0, 0))
+                else:
+                    draw_button(new_game_button, (0, 255, 0), "New Game", (255, 255, 255))
+
+                if restart_game_button.collidepoint(event.pos):
+                    draw_hover_button(restart_game_button, (255, 255, 0), "Restart", (0, 0, 0))
+                else:
+                    draw_button(restart_game_button, (255, 255, 0), "Restart", (210, 210, 210))
+
+                if exit_button.collidepoint(event.pos):
+                    draw_hover_button(exit_button, (255, 0, 0), "Exit", (0, 0, 0))
+                else:
+                    draw_button(exit_button, (255, 0, 0), "Exit", (255, 255, 255))
+
+                if minimax_radio_button.collidepoint(event.pos):
+                    draw_hover_button(minimax_radio_button, (255, 218, 185), "Minimax", (0, 0, 0))
+                else:
+                    draw_button(minimax_radio_button, minimax_radio_button_color, "Minimax", (255, 255, 255))
+
+                if alphabeta_radio_button.collidepoint(event.pos):
+                    draw_hover_button(alphabeta_radio_button, (135, 206, 250), "Alpha-Beta", (0, 0, 0))
+                else:
+                    draw_button(alphabeta_radio_button, alphabeta_radio_button_color, "Alpha-Beta", (255, 255, 255))
+
+            pygame.display.update()
+
+            # Handle mouse click events
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                try:
+                    # Any of the game buttons abandons a search that is still running
+                    if ai_search is not None and (new_game_button.collidepoint(event.pos) or
+                                                  restart_game_button.collidepoint(event.pos) or
+                                                  exit_button.collidepoint(event.pos)):
+                        ai_search.cancel()
+                        ai_search = None
+                    if ponder is not None and (new_game_button.collidepoint(event.pos) or
+                                               restart_game_button.collidepoint(event.pos) or
+                                               exit_button.collidepoint(event.pos)):
+                        ponder.finish()
+                        ponder = None
+                        ai_time_budget = AI_TIME_BUDGET_MS
+                    if (new_game_button.collidepoint(event.pos) or restart_game_button.collidepoint(event.pos) or
+                            exit_button.collidepoint(event.pos)):
+                        game_log.save(board)
+
+                    # Start a new game
+                    if new_game_button.collidepoint(event.pos):
+                        # Initialize the game board and reset game parameters
+                        board = create_board()
+                        draw_board(board)
+                        game_over = False  # Reset game_over flag
+                        turn = random.randint(PLAYER, AI)
+                        game_log = GameLog(turn)
 
-            if alphabeta_radio_button.collidepoint(event.pos):
-                draw_hover_button(alphabeta_radio_button, (135, 206, 250), "Alpha-Beta", (0, 0, 0))
-            else:
-                draw_button(alphabeta_radio_button, alphabeta_radio_button_color, "Alpha-Beta", (255, 255, 255))
+                        # Clear the winner text when the new game is initiated
+                        screen.fill(BLACK, (0, 0, width, SQUARESIZE))
 
-        pygame.display.update()
+                    # Restart the current game
+                    elif restart_game_button.collidepoint(event.pos):
+                        # Initialize the game board and reset game parameters
+                        board = create_board()
+                        draw_board(board)
+                        game_over = False  # Reset game_over flag
+                        turn = random.randint(PLAYER, AI)
+                        game_log = GameLog(turn)
 
-        # Handle mouse click events
-        if event.type == pygame.MOUSEBUTTONDOWN:
-            try:
-                # Start a new game
-                if new_game_button.collidepoint(event.pos):
-                    # Set the current algorithm based on the selected button
-                    if minimax_radio_button_color == (255, 218, 185):
-                        current_algorithm = minimax
-                    elif alphabeta_radio_button_color == (135, 206, 250):
-                        current_algorithm = alpha_beta_ab
+                        # Clear the winner text when the restart game is initiated
+                        screen.fill(BLACK, (0, 0, width, SQUARESIZE))
 
-                    # Initialize the game board and reset game parameters
-                    board = create_board()
-                    draw_board(board)
-                    game_over = False  # Reset game_over flag
-                    turn = random.randint(PLAYER, AI)
-
-                    # Clear the winner text when the new game is initiated
-                    screen.fill(BLACK, (0, 0, width, SQUARESIZE))
-
-                # Restart the current game
-                elif restart_game_button.collidepoint(event.pos):
-                    # Initialize the game board and reset game parameters
-                    board = create_board()
-                    draw_board(board)
-                    game_over = False  # Reset game_over flag
-                    turn = random.randint(PLAYER, AI)
-
-                    # Clear the winner text when the restart game is initiated
-                    screen.fill(BLACK, (0, 0, width, SQUARESIZE))
-
-                # Exit the game
-                elif exit_button.collidepoint(event.pos):
-                    sys.exit()
-
-                # Select the Minimax algorithm
-                elif minimax_radio_button.collidepoint(event.pos):
-                    minimax_radio_button_color = (255, 140, 140)
-                    alphabeta_radio_button_color = (173, 216, 230)
-
-                # Select the Alpha-Beta Pruning algorithm
-                elif alphabeta_radio_button.collidepoint(event.pos):
-                    alphabeta_radio_button_color = (100, 160, 200)
-                    minimax_radio_button_color = (255, 220, 230)
-
-                # Handle player's move
-                elif turn == PLAYER:
-                    posx = event.pos[0]
-                    col = int(math.floor(posx / SQUARESIZE))
-
-                    if is_valid_location(board, col):
-                        row = get_next_open_row(board, col)
-                        drop_piece(board, row, col, PLAYER_PIECE)
-
-                        if winning_move(board, PLAYER_PIECE):
-                            label = myfont.render("Player 1 wins!!", 1, RED)
-                            screen.blit(label, (40, 10))
-                            game_over = True
-
-                        turn += 1
-                        turn %= 2
+                    # Exit the game
+                    elif exit_button.collidepoint(event.pos):
+                        sys.exit()
 
-                        draw_board(board)
-                        pygame.display.update()  # Update the screen to clear the message
+                    # Select the Minimax algorithm
+                    elif minimax_radio_button.collidepoint(event.pos):
+                        minimax_radio_button_color = (255, 140, 140)
+                        alphabeta_radio_button_color = (173, 216, 230)
+                        current_algorithm = minimax
+
+                    # Select the Alpha-Beta Pruning algorithm
+                    elif alphabeta_radio_button.collidepoint(event.pos):
+                        alphabeta_radio_button_color = (100, 160, 200)
+                        minimax_radio_button_color = (255, 220, 230)
+                        current_algorithm = alpha_beta_ab
 
-            except IndexError:
-                # Display a message when the player clicks out of bounds
-                label = myfont.render("Play on to proceed", 1, (255, 255, 255))
+                    # Handle player's move
+                    elif turn == PLAYER:
+                        posx = event.pos[0]
+                        col = int(math.floor(posx / SQUARESIZE))
+
+                        if is_valid_location(board, col):
+                            # Stop pondering; the AI gets less time if it already searched this move
+                            if ponder is not None:
+                                ponder.finish()
+                                ponder = None
+                                ai_time_budget = ponderer.reply_budget(col, AI_TIME_BUDGET_MS)
+
+                            row = get_next_open_row(board, col)
+                            drop_piece(board, row, col, PLAYER_PIECE)
+                            game_log.add(col)
+
+                            if winning_move(board, PLAYER_PIECE):
+                                label = myfont.render("Player 1 wins!!", 1, RED)
+                                screen.blit(label, (40, 10))
+                                game_over = True
+
+                            turn += 1
+                            turn %= 2
+
+                            draw_board(board)
+                            pygame.display.update()  # Update the screen to clear the message
+
+                except IndexError:
+                    # Display a message when the player clicks out of bounds
+                    label = myfont.render("Play on to proceed", 1, (255, 255, 255))
+                    screen.blit(label, (40, 10))
+                    pygame.display.update()
+                    time.sleep(1)  # Pause for a short duration to make the message visible
+
+        # AI's turn and other game logic
+        if turn == AI and not game_over and ai_search is None:
+            clear_banner()
+            # Start searching for the AI's move using the chosen algorithm
+            ai_search = AISearch(board, current_algorithm, ai_time_budget)
+            ai_time_budget = AI_TIME_BUDGET_MS
+
+        elif turn == AI and not game_over and ai_search.result is None:
+            # Still thinking: keep the window responsive and show progress
+            draw_progress(ai_search)
+
+        elif turn == AI and not game_over:
+            col, minimax_score, nodes_explored, elapsed_time, search_info = ai_search.result
+            algorithm = ai_search.algorithm
+            if ai_search.error is not None:
+                # The search failed and col is the fallback move: say so before playing it
+                label = pygame.font.SysFont("monospace", 40).render(f"AI search failed: {ai_search.error}", 1, RED)
                 screen.blit(label, (40, 10))
                 pygame.display.update()
                 time.sleep(1)  # Pause for a short duration to make the message visible
+                clear_banner()
+            ai_search = None
+            tt_stats = None
+            search_depth = None
+            ebf = None
+            ponder_stats = None
+            if search_info is not None:
+                tt_stats = transposition_table.stats()
+                if ponderer.hits + ponderer.misses:
+                    ponder_stats = ponderer.stats()
+                search_depth = search_info["depth"]
+                ebf = search_info["iterations"][-1]["ebf"] if search_info["iterations"] else None
+                if "solver" in search_info:
+                    solved = search_info["solver"]
+                    if solved["winner"] is None:
+                        search_depth = "solved, draw"
+                    else:
+                        winner = "AI" if solved["winner"] == AI_PIECE else "Player"
+                        search_depth = f"solved, {winner} wins in {solved['moves_to_win']}"
+
+            # Make the AI's move
+            if is_valid_location(board, col):
+                row = get_next_open_row(board, col)
+                drop_piece(board, row, col, AI_PIECE)
+                if algorithm == minimax:
+                    game_log.ai_player = ("minimax", 4, None)
+                else:
+                    game_log.ai_player = ("alpha_beta", None, AI_TIME_BUDGET_MS)
+                game_log.add(col, nodes_explored, elapsed_time)
+
+                if winning_move(board, AI_PIECE):
+                    label = myfont.render("Player 2 wins!!", 1, YELLOW)
+                    screen.blit(label, (40, 10))
+                    game_over = True
+
+                draw_board(board)
+
+                turn += 1
+                turn %= 2
+
+                # Display information only for the AI's move
+                pygame.draw.rect(screen, BLACK, (0, height - 95, width, 95))
+                draw_info(elapsed_time, nodes_explored, tt_stats, search_depth, ebf, ponder_stats)
+
+            # Check for a terminal state
+            if is_terminal_node(board):
+                if winning_move(board, PLAYER_PIECE):
+                    label = myfont.render("Player 1 wins!!", 1, RED)
+                    screen.blit(label, (40, 10))
+                elif winning_move(board, AI_PIECE):
+                    label = myfont.render("Player 2 wins!!", 1, YELLOW)
+                    screen.blit(label, (40, 10))
+                else:
+                    label = myfont.render("It's a draw!!", 1, RED)
+                    screen.blit(label, (40, 10))
 
-    # AI's turn and other game logic
-    if turn == AI and not game_over:
-        clear_banner()
-        # Set the current algorithm based on the selected button
-        if minimax_radio_button_color == (255, 218, 185):
-            current_algorithm = minimax
-        elif alphabeta_radio_button_color == (135, 206, 250):
-            current_algorithm = alpha_beta_ab
-
-        # Get the AI's move using the chosen algorithm
-        if current_algorithm == minimax:
-            col, minimax_score, nodes_explored, elapsed_time = current_algorithm(board, 4, True)
-        else:
-            col, minimax_score, nodes_explored, elapsed_time = current_algorithm(board, 4, -math.inf, math.inf, True)
-
-        # Make the AI's move
-        if is_valid_location(board, col):
-            row = get_next_open_row(board, col)
-            drop_piece(board, row, col, AI_PIECE)
-
-            if winning_move(board, AI_PIECE):
-                label = myfont.render("Player 2 wins!!", 1, YELLOW)
-                screen.blit(label, (40, 10))
                 game_over = True
 
-            draw_board(board)
-
-            turn += 1
-            turn %= 2
-
-            # Display information only for the AI's move
-            pygame.draw.rect(screen, BLACK, (0, height - 70, width, 70))
-            draw_info(elapsed_time, nodes_explored)
+            # Think about the reply to each of the player's moves while they choose one
+            if AI_PONDER and search_info is not None and not game_over:
+                # A pondered reply counts once it is as deep as the search just made
+                ponder = PonderThread(board, search_info["depth"])
 
-        # Check for a terminal state
-        if is_terminal_node(board):
-            if winning_move(board, PLAYER_PIECE):
-                label = myfont.render("Player 1 wins!!", 1, RED)
-                screen.blit(label, (40, 10))
-            elif winning_move(board, AI_PIECE):
-                label = myfont.render("Player 2 wins!!", 1, YELLOW)
-                screen.blit(label, (40, 10))
-            else:
-                label = myfont.render("It's a draw!!", 1, RED)
-                screen.blit(label, (40, 10))
+        if game_over:
+            game_log.save(board)
 
-            game_over = True
-
-    pygame.display.update()
+        pygame.display.update()
+        clock.tick(30)
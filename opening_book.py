@@ -0,0 +1,164 @@
+# Connect 4 opening book
+# Builds a table of best moves and scores for every position up to a number of plies
+# using the engine's own search, and looks positions up at run time through a
+# memory-mapped file so nothing has to be parsed when the book is loaded.
+#
+# File layout (little endian):
+#   header   magic b"C4BK", version (u16), plies (u8), search depth (u8), entry count (u32)
+#   keys     entry count x u64, sorted ascending
+#   scores   entry count x i64, from AI_PIECE's point of view like alpha_beta_ab
+#   moves    entry count x u8, best column for the canonical orientation
+#
+# Keys are engine.position_key() folded with its mirror image (the smaller of the
+# two is stored), with the top bit set when PLAYER_PIECE is to move.
+
+import math
+import mmap
+import struct
+import sys
+import time
+
+import engine
+from engine import (COLUMN_COUNT, PLAYER_PIECE, AI_PIECE, create_board, drop_piece, remove_piece,
+                    get_next_open_row, get_valid_locations, is_terminal_node, alpha_beta_ab, position_key,
+                    mirror_mask, TranspositionTable, MoveOrdering)
+
+BOOK_MAGIC = b"C4BK"
+BOOK_VERSION = 1
+HEADER_FORMAT = "<4sHBBI"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+PLAYER_TO_MOVE_BIT = 1 << 63
+
+# Default file name the game looks for
+BOOK_PATH = "opening_book.bin"
+
+
+# Canonical book key for a position and the side to move. Returns the key and whether
+# the position was mirrored to get it.
+def book_key(board, maximizingPlayer):
+    key = position_key(board)
+    mirrored = mirror_mask(key)
+    flipped = mirrored < key
+    if flipped:
+        key = mirrored
+    if not maximizingPlayer:
+        key |= PLAYER_TO_MOVE_BIT
+    return key, flipped
+
+
+# Read-only view of a book file. lookup() binary searches the memory-mapped keys.
+class OpeningBook:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.plies, self.depth, self.count = struct.unpack_from(HEADER_FORMAT, self.data, 0)
+        if magic != BOOK_MAGIC or version != BOOK_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {BOOK_VERSION} opening book")
+        self.scores_offset = HEADER_SIZE + 8 * self.count
+        self.moves_offset = self.scores_offset + 8 * self.count
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    # Return (column, score) for a position in the book, or None
+    def lookup(self, board, maximizingPlayer):
+        if sum(board.heights) > self.plies:
+            return None
+        key, flipped = book_key(board, maximizingPlayer)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if struct.unpack_from("<Q", self.data, HEADER_SIZE + 8 * middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.count or struct.unpack_from("<Q", self.data, HEADER_SIZE + 8 * low)[0] != key:
+            self.misses += 1
+            return None
+        self.hits += 1
+        score = struct.unpack_from("<q", self.data, self.scores_offset + 8 * low)[0]
+        column = self.data[self.moves_offset + low]
+        if flipped:
+            column = COLUMN_COUNT - 1 - column
+        return column, score
+
+    def stats(self):
+        return {"entries": self.count, "plies": self.plies, "depth": self.depth, "hits": self.hits,
+                "misses": self.misses}
+
+
+# Books cover the standard board only
+def _check_geometry():
+    if engine.GEOMETRY != engine.DEFAULT_GEOMETRY:
+        raise ValueError(f"opening books are only for the standard board, not {engine.GEOMETRY}")
+
+
+# Load a book file and make the engine's searches use it
+def load_book(path=BOOK_PATH):
+    _check_geometry()
+    engine.opening_book = OpeningBook(path)
+    return engine.opening_book
+
+
+# Search every position reachable in up to `plies` moves (with either side starting)
+# to `depth` and write the results to `path`. Mirror images are searched once.
+def build_book(path=BOOK_PATH, plies=6, depth=8, progress=None):
+    _check_geometry()
+    previous_book, engine.opening_book = engine.opening_book, None
+    ordering = MoveOrdering()
+    entries = {}
+
+    def visit(board, maximizingPlayer, ply):
+        if is_terminal_node(board):
+            return
+        key, flipped = book_key(board, maximizingPlayer)
+        if key in entries:
+            return
+        # A fresh table per position keeps every score a plain depth-limited result
+        column, score, _, _ = alpha_beta_ab(board, depth, -math.inf, math.inf, maximizingPlayer, TranspositionTable(4),
+                                            None, None, ordering)
+        if flipped:
+            column = COLUMN_COUNT - 1 - column
+        entries[key] = (int(score), column)
+        if progress is not None and len(entries) % 1000 == 0:
+            progress(len(entries))
+        if ply < plies:
+            piece = AI_PIECE if maximizingPlayer else PLAYER_PIECE
+            for col in get_valid_locations(board):
+                drop_piece(board, get_next_open_row(board, col), col, piece)
+                visit(board, not maximizingPlayer, ply + 1)
+                remove_piece(board, col)
+
+    try:
+        visit(create_board(), True, 0)
+        visit(create_board(), False, 0)
+    finally:
+        engine.opening_book = previous_book
+
+    keys = sorted(entries)
+    with open(path, "wb") as book_file:
+        book_file.write(struct.pack(HEADER_FORMAT, BOOK_MAGIC, BOOK_VERSION, plies, depth, len(keys)))
+        book_file.write(struct.pack(f"<{len(keys)}Q", *keys))
+        book_file.write(struct.pack(f"<{len(keys)}q", *(entries[key][0] for key in keys)))
+        book_file.write(bytes(entries[key][1] for key in keys))
+    return len(keys)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the Connect 4 opening book.")
+    parser.add_argument("--plies", type=int, default=6, help="book covers positions with up to this many pieces")
+    parser.add_argument("--depth", type=int, default=8, help="search depth for every book position")
+    parser.add_argument("--output", default=BOOK_PATH, help="book file to write")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    count = build_book(args.output, args.plies, args.depth,
+                       progress=lambda n: print(f"{n} positions", file=sys.stderr, flush=True))
+    print(f"Wrote {count} positions to {args.output} in {time.time() - start_time:.1f} s")
@@ -0,0 +1,214 @@
+# Connect 4 search profiler
+# Opt-in instrumentation for minimax and alpha_beta_ab. start() swaps timed and
+# counting wrappers into the engine module and stop() puts the originals back, so
+# the searches carry no extra cost unless a profiler is running. While it runs it
+# records, per ply from the root of each search: nodes, interior nodes and their
+# children (the branching factor), beta cutoffs by move index, leaf evaluations and
+# terminal positions. It also times winning_move, evaluate (the cached evaluation)
+# and move generation (get_valid_locations and MoveOrdering.order), and the root
+# searches and root moves for a Chrome trace timeline (chrome://tracing or
+# https://ui.perfetto.dev).
+#
+#     profiler = SearchProfiler()
+#     profiler.start()
+#     engine.alpha_beta_ab(board, 8, -math.inf, math.inf, True)
+#     profiler.stop()
+#     profiler.write_json("profile.json")
+#     profiler.write_trace("trace.json")
+#
+# Searches must be called through the engine module (engine.alpha_beta_ab), not a
+# name imported before start(), for the root call to be seen. Timings include the
+# wrappers' own overhead, so compare them with each other rather than with an
+# unprofiled run.
+
+import json
+import os
+import threading
+import time
+
+import engine
+
+# Functions whose time is measured, by report category
+TIMED_FUNCTIONS = {
+    "winning_move": "winning_move",
+    "evaluate": "evaluation",
+    "get_valid_locations": "move_generation",
+}
+
+SEARCH_FUNCTIONS = ("minimax", "alpha_beta_ab")
+
+
+class SearchProfiler:
+    # trace_plies: root searches (ply 0) and, with 1, each root move get a trace event
+    def __init__(self, trace_plies=1):
+        self.trace_plies = trace_plies
+        self.originals = None
+        self.reset()
+
+    def reset(self):
+        self.stack = []  # one [children] counter per search call in progress
+        self.root_heights = None
+        self.nodes = []  # the per-ply lists are indexed by ply from the root
+        self.interior = []
+        self.children = []
+        self.leaf_evals = []
+        self.terminal = []
+        self.cutoffs = []  # per ply, a list of cutoff counts by move index
+        self.total_nodes = 0
+        self.searches = 0
+        self.search_time = 0.0
+        self.times = {category: 0.0 for category in TIMED_FUNCTIONS.values()}
+        self.calls = {category: 0 for category in TIMED_FUNCTIONS.values()}
+        self.events = []
+        self.start_time = time.perf_counter()
+
+    # Install the wrappers into the engine module
+    def start(self):
+        if self.originals is not None:
+            return
+        self.originals = {name: getattr(engine, name)
+                          for name in SEARCH_FUNCTIONS + tuple(TIMED_FUNCTIONS) + ("is_terminal_node",)}
+        self.originals["MoveOrdering.order"] = engine.MoveOrdering.order
+        self.originals["MoveOrdering.record_cutoff"] = engine.MoveOrdering.record_cutoff
+        for name in SEARCH_FUNCTIONS:
+            setattr(engine, name, self._wrap_search(self.originals[name]))
+        for name, category in TIMED_FUNCTIONS.items():
+            setattr(engine, name, self._wrap_timed(self.originals[name], category, name == "evaluate"))
+        engine.is_terminal_node = self._wrap_terminal(self.originals["is_terminal_node"])
+        engine.MoveOrdering.order = self._wrap_timed(self.originals["MoveOrdering.order"], "move_generation")
+        engine.MoveOrdering.record_cutoff = self._wrap_cutoff(self.originals["MoveOrdering.record_cutoff"])
+
+    # Put the engine's own functions back
+    def stop(self):
+        if self.originals is None:
+            return
+        engine.MoveOrdering.order = self.originals.pop("MoveOrdering.order")
+        engine.MoveOrdering.record_cutoff = self.originals.pop("MoveOrdering.record_cutoff")
+        for name, function in self.originals.items():
+            setattr(engine, name, function)
+        self.originals = None
+
+    def _at_ply(self, counts, ply):
+        while len(counts) <= ply:
+            counts.append(0)
+        counts[ply] += 1
+
+    def _wrap_search(self, search):
+        profiler = self
+        perf_counter = time.perf_counter
+
+        def wrapper(board, depth, *args, **kwargs):
+            stack = profiler.stack
+            ply = len(stack)
+            if ply:
+                stack[-1][0] += 1
+            else:
+                profiler.root_heights = board.heights[:]
+            frame = [0]
+            stack.append(frame)
+            profiler.total_nodes += 1
+            nodes_before = profiler.total_nodes
+            start = perf_counter()
+            try:
+                return search(board, depth, *args, **kwargs)
+            finally:
+                end = perf_counter()
+                stack.pop()
+                profiler._at_ply(profiler.nodes, ply)
+                if frame[0]:
+                    profiler._at_ply(profiler.interior, ply)
+                    while len(profiler.children) <= ply:
+                        profiler.children.append(0)
+                    profiler.children[ply] += frame[0]
+                if ply == 0:
+                    profiler.searches += 1
+                    profiler.search_time += end - start
+                if ply <= profiler.trace_plies:
+                    if ply == 0:
+                        name = f"{search.__name__} depth {depth}"
+                    else:
+                        moved = [col for col, height in enumerate(board.heights)
+                                 if height != profiler.root_heights[col]]
+                        name = f"move {moved[0] + 1}" if len(moved) == 1 else f"depth {depth}"
+                    profiler.events.append({"name": name, "ph": "X", "pid": os.getpid(),
+                                            "tid": threading.get_ident(),
+                                            "ts": (start - profiler.start_time) * 1e6, "dur": (end - start) * 1e6,
+                                            "args": {"depth": depth,
+                                                     "nodes": profiler.total_nodes - nodes_before + 1}})
+        wrapper.__name__ = search.__name__
+        return wrapper
+
+    def _wrap_timed(self, function, category, leaf_eval=False):
+        profiler = self
+        perf_counter = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.times[category] += perf_counter() - start
+                profiler.calls[category] += 1
+                if leaf_eval and profiler.stack:
+                    profiler._at_ply(profiler.leaf_evals, len(profiler.stack) - 1)
+        wrapper.__name__ = function.__name__
+        return wrapper
+
+    def _wrap_terminal(self, function):
+        profiler = self
+
+        def wrapper(board):
+            terminal = function(board)
+            if terminal and profiler.stack:
+                profiler._at_ply(profiler.terminal, len(profiler.stack) - 1)
+            return terminal
+        return wrapper
+
+    def _wrap_cutoff(self, function):
+        profiler = self
+
+        def wrapper(ordering, board, piece, col, depth, move_index, pruned):
+            if profiler.stack:
+                ply = len(profiler.stack) - 1
+                while len(profiler.cutoffs) <= ply:
+                    profiler.cutoffs.append([])
+                by_index = profiler.cutoffs[ply]
+                while len(by_index) <= move_index:
+                    by_index.append(0)
+                by_index[move_index] += 1
+            return function(ordering, board, piece, col, depth, move_index, pruned)
+        return wrapper
+
+    # Everything recorded so far as a dict of plain numbers and lists
+    def report(self):
+        plies = []
+        for ply, nodes in enumerate(self.nodes):
+            interior = self.interior[ply] if ply < len(self.interior) else 0
+            children = self.children[ply] if ply < len(self.children) else 0
+            cutoffs = self.cutoffs[ply] if ply < len(self.cutoffs) else []
+            plies.append({"ply": ply, "nodes": nodes, "interior": interior,
+                          "branching_factor": children / interior if interior else None,
+                          "leaf_evals": self.leaf_evals[ply] if ply < len(self.leaf_evals) else 0,
+                          "terminal": self.terminal[ply] if ply < len(self.terminal) else 0,
+                          "cutoffs": sum(cutoffs), "cutoffs_by_move_index": cutoffs})
+        interior = sum(self.interior)
+        measured = sum(self.times.values())
+        return {"searches": self.searches, "nodes": sum(self.nodes),
+                "branching_factor": sum(self.children) / interior if interior else None,
+                "leaf_evals": sum(self.leaf_evals), "terminal": sum(self.terminal),
+                "cutoffs": sum(sum(by_index) for by_index in self.cutoffs),
+                "time_ms": {"search": self.search_time * 1000,
+                            **{category: seconds * 1000 for category, seconds in self.times.items()},
+                            "other": max(0.0, self.search_time - measured) * 1000},
+                "calls": dict(self.calls),
+                "plies": plies}
+
+    def write_json(self, path):
+        with open(path, "w") as output:
+            json.dump(self.report(), output, indent=2)
+
+    # Chrome trace event format: complete ("X") events, timestamps in microseconds
+    def write_trace(self, path):
+        with open(path, "w") as output:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms",
+                       "otherData": {"report": self.report()}}, output)
@@ -0,0 +1,381 @@
+# Connect 4 analysis server
+# A long-running asyncio service that answers "which move should be played here" for
+# many games at once, without a display. Positions arrive as HTTP requests on a local
+# TCP port or a Unix socket and are searched by a process pool of engine workers.
+# The workers live as long as the server, so their transposition tables, evaluation
+# caches and opening book stay warm from one request to the next.
+#
+# Requests that queue up while every worker is busy are handed to the next free
+# worker together, as one batch. A request's time budget counts from when it
+# arrived, so time spent waiting in the queue comes off its search; a request that
+# has waited its whole budget still gets a depth 1 search. GET /metrics reports
+# throughput, latency percentiles, queue wait, batch sizes and the workers' cache
+# statistics. loadgen.py plays many games against a running server.
+#
+#     python server.py --port 8765 --workers 4
+#     curl -d '{"position": "4453", "time_budget_ms": 200}' localhost:8765/move
+#     curl localhost:8765/metrics
+#
+# API (JSON bodies):
+#   POST /move     {"position": move string or board array (see engine.parse_position),
+#                   "time_budget_ms": thinking time, "depth": optional depth limit,
+#                   "first_piece": piece that moved first, PLAYER_PIECE by default}
+#                  -> {"column", "score", "nodes", "depth", "to_move", "search_ms",
+#                      "queue_ms", "latency_ms", "batch_size", "worker"}
+#                  Scores are from AI_PIECE's point of view, like alpha_beta_ab.
+#   GET /metrics   server statistics
+#   GET /health    {"status": "ok"}
+
+import asyncio
+import json
+import math
+import os
+import signal
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import engine
+from engine import PLAYER_PIECE, AI_PIECE, parse_position, is_terminal_node, alpha_beta_ab, iterative_deepening
+from geometry import parse_geometry
+from opening_book import BOOK_PATH, load_book
+
+DEFAULT_PORT = 8765
+DEFAULT_TIME_BUDGET_MS = 200
+MAX_TIME_BUDGET_MS = 10000
+
+# Most requests one worker takes at a time
+MAX_BATCH = 16
+
+# Latency samples kept for the percentiles, and the window for the recent throughput
+LATENCY_SAMPLES = 10000
+THROUGHPUT_WINDOW_S = 10
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                500: "Internal Server Error"}
+
+
+# Value at a fraction (0.5 for the median, 0.99 for p99) of a list of samples,
+# nearest rank. None for no samples.
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def _init_worker(geometry, book_path):
+    engine.configure(geometry)
+    if book_path and os.path.exists(book_path) and geometry == engine.DEFAULT_GEOMETRY:
+        load_book(book_path)
+
+# Search a batch of requests in a worker process, one after the other. Deadlines are
+# wall-clock times, so each request gets what is left of its own budget when its
+# turn comes. Returns one result per request and the worker's cache statistics.
+def search_batch(batch):
+    results = []
+    for position, first_piece, max_depth, deadline in batch:
+        start_time = time.time()
+        board, piece = parse_position(position, first_piece)
+        maximizingPlayer = piece == AI_PIECE
+        if is_terminal_node(board):
+            _, score, nodes, _ = alpha_beta_ab(board, 0, -math.inf, math.inf, maximizingPlayer)
+            column, depth = None, 0
+        else:
+            budget = max(0.0, deadline - start_time) * 1000
+            column, score, nodes, _, info = iterative_deepening(board, budget, maximizingPlayer, max_depth=max_depth)
+            depth = info["depth"]
+        results.append({"column": column, "score": score, "nodes": nodes, "depth": depth, "to_move": piece,
+                        "search_ms": (time.time() - start_time) * 1000})
+    caches = {"transposition_table": engine.transposition_table.stats()}
+    if engine.eval_cache is not None:
+        caches["eval_cache"] = engine.eval_cache.stats()
+    return results, os.getpid(), caches
+
+
+# Request counts, latency samples and batch sizes for GET /metrics
+class ServerMetrics:
+    def __init__(self):
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.start_time = time.time()
+        self.requests = 0
+        self.completed = 0
+        self.rejected = 0  # invalid requests, answered without searching
+        self.errors = 0  # requests answered with a 500
+        self.nodes = 0
+        self.search_time = 0.0
+        self.batches = 0
+        self.batched_requests = 0
+        self.largest_batch = 0
+        self.latency_ms = deque(maxlen=LATENCY_SAMPLES)
+        self.queue_ms = deque(maxlen=LATENCY_SAMPLES)
+        self.search_ms = deque(maxlen=LATENCY_SAMPLES)
+        self.finished_at = deque()  # completion times within THROUGHPUT_WINDOW_S
+        self.workers = {}  # per worker pid: batches, requests and latest cache statistics
+
+    def record_batch(self, size, pid, caches):
+        self.batches += 1
+        self.batched_requests += size
+        self.largest_batch = max(self.largest_batch, size)
+        worker = self.workers.setdefault(pid, {"batches": 0, "requests": 0})
+        worker["batches"] += 1
+        worker["requests"] += size
+        worker.update(caches)
+
+    def record_result(self, result):
+        now = time.time()
+        self.completed += 1
+        self.nodes += result["nodes"]
+        self.search_time += result["search_ms"] / 1000
+        self.latency_ms.append(result["latency_ms"])
+        self.queue_ms.append(result["queue_ms"])
+        self.search_ms.append(result["search_ms"])
+        self.finished_at.append(now)
+        while self.finished_at and self.finished_at[0] < now - THROUGHPUT_WINDOW_S:
+            self.finished_at.popleft()
+
+    def stats(self, queued=0, busy_workers=0, workers=0):
+        now = time.time()
+        uptime = now - self.start_time
+        recent = sum(1 for finished in self.finished_at if finished >= now - THROUGHPUT_WINDOW_S)
+
+        def summary(samples):
+            return {"mean": sum(samples) / len(samples) if samples else None, "p50": percentile(samples, 0.5),
+                    "p90": percentile(samples, 0.9), "p99": percentile(samples, 0.99),
+                    "max": max(samples) if samples else None}
+
+        return {"uptime_s": uptime, "requests": self.requests, "completed": self.completed,
+                "rejected": self.rejected, "errors": self.errors,
+                "in_flight": self.requests - self.completed - self.rejected - self.errors, "queued": queued,
+                "workers": workers, "busy_workers": busy_workers,
+                "throughput_rps": self.completed / uptime if uptime else 0.0,
+                "recent_throughput_rps": recent / min(uptime, THROUGHPUT_WINDOW_S) if uptime else 0.0,
+                "nodes_per_sec": self.nodes / self.search_time if self.search_time else None,
+                "latency_ms": summary(self.latency_ms), "queue_ms": summary(self.queue_ms),
+                "search_ms": summary(self.search_ms),
+                "batches": {"count": self.batches, "largest": self.largest_batch,
+                            "mean_size": self.batched_requests / self.batches if self.batches else None},
+                "per_worker": {str(pid): worker for pid, worker in self.workers.items()}}
+
+
+class AnalysisServer:
+    def __init__(self, workers=None, max_batch=MAX_BATCH, batch_window_ms=0.0,
+                 default_time_budget_ms=DEFAULT_TIME_BUDGET_MS, max_time_budget_ms=MAX_TIME_BUDGET_MS,
+                 book_path=BOOK_PATH):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_batch = max_batch
+        self.batch_window_ms = batch_window_ms
+        self.default_time_budget_ms = default_time_budget_ms
+        self.max_time_budget_ms = max_time_budget_ms
+        self.book_path = book_path
+        self.metrics = ServerMetrics()
+        self.pool = None
+        self.queue = None
+        self.free_workers = None
+        self.busy_workers = 0
+        self.servers = []
+        self.dispatcher = None
+
+    # Start the worker pool and listen on a TCP port, a Unix socket, or both
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT, unix_path=None):
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                        initargs=(engine.GEOMETRY, self.book_path))
+        self.queue = asyncio.Queue()
+        self.free_workers = asyncio.Semaphore(self.workers)
+        self.metrics.reset_stats()
+        self.dispatcher = asyncio.create_task(self._dispatch())
+        if port is not None:
+            self.servers.append(await asyncio.start_server(self._handle_connection, host, port))
+        if unix_path is not None:
+            self.servers.append(await asyncio.start_unix_server(self._handle_connection, unix_path))
+
+    async def serve_forever(self):
+        await asyncio.gather(*(server.serve_forever() for server in self.servers))
+
+    async def close(self):
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        self.servers = []
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+            self.dispatcher = None
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    # Queue a search and wait for its result. Raises ValueError or TypeError for an
+    # invalid request.
+    async def analyze(self, position, time_budget_ms=None, depth=None, first_piece=PLAYER_PIECE):
+        arrival = time.time()
+        if time_budget_ms is None:
+            time_budget_ms = self.default_time_budget_ms
+        if (isinstance(time_budget_ms, bool) or not isinstance(time_budget_ms, (int, float)) or
+                not 0 < time_budget_ms <= self.max_time_budget_ms):
+            raise ValueError(f"time_budget_ms must be between 0 and {self.max_time_budget_ms}")
+        if depth is not None and (isinstance(depth, bool) or not isinstance(depth, int) or depth < 1):
+            raise ValueError("depth must be a positive integer")
+        if isinstance(first_piece, bool) or first_piece not in (PLAYER_PIECE, AI_PIECE):
+            raise ValueError(f"first_piece must be {PLAYER_PIECE} or {AI_PIECE}")
+        # Reject bad positions before they reach a worker
+        if not isinstance(position, (str, list)):
+            raise ValueError("position must be a move string or a board array")
+        parse_position(position, first_piece)
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((position, first_piece, depth, arrival + time_budget_ms / 1000, arrival, future))
+        return await future
+
+    # Hand queued requests to free workers. Requests waiting at the same time are
+    # shared out evenly between the free workers, up to max_batch per worker.
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            request = await self.queue.get()
+            await self.free_workers.acquire()
+            if self.batch_window_ms and self.queue.empty():
+                await asyncio.sleep(self.batch_window_ms / 1000)
+            free = self.workers - self.busy_workers
+            size = min(self.max_batch, math.ceil((1 + self.queue.qsize()) / free))
+            batch = [request]
+            while len(batch) < size:
+                batch.append(self.queue.get_nowait())
+            self.busy_workers += 1
+            loop.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        dispatched = time.time()
+        try:
+            tasks = [(position, first_piece, depth, deadline)
+                     for position, first_piece, depth, deadline, _, _ in batch]
+            results, pid, caches = await asyncio.get_running_loop().run_in_executor(self.pool, search_batch, tasks)
+        except Exception as error:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        finally:
+            self.busy_workers -= 1
+            self.free_workers.release()
+        finished = time.time()
+        self.metrics.record_batch(len(batch), pid, caches)
+        for (*_, arrival, future), result in zip(batch, results):
+            result.update({"queue_ms": (dispatched - arrival) * 1000, "latency_ms": (finished - arrival) * 1000,
+                           "batch_size": len(batch), "worker": pid})
+            self.metrics.record_result(result)
+            if not future.done():
+                future.set_result(result)
+
+    async def _route(self, method, path, body):
+        path = path.split("?", 1)[0]
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/metrics":
+            return 200, self.metrics.stats(self.queue.qsize(), self.busy_workers, self.workers)
+        if path != "/move":
+            return 404, {"error": f"no such endpoint {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST for /move"}
+        self.metrics.requests += 1
+        try:
+            request = json.loads(body or b"{}")
+            if not isinstance(request, dict) or "position" not in request:
+                raise ValueError("expected a JSON object with a position")
+            result = await self.analyze(request["position"], request.get("time_budget_ms"), request.get("depth"),
+                                        request.get("first_piece", PLAYER_PIECE))
+        except (ValueError, TypeError) as error:
+            self.metrics.rejected += 1
+            return 400, {"error": str(error)}
+        except Exception as error:
+            self.metrics.errors += 1
+            return 500, {"error": f"search failed: {error!r}"}
+        return 200, result
+
+    # Minimal HTTP/1.1 with keep-alive: one JSON request and response at a time
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                parts = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if len(parts) != 3:
+                    status, payload = 400, {"error": "malformed request line"}
+                    keep_alive = False
+                else:
+                    method, path, version = parts
+                    length = int(headers.get("content-length", 0) or 0)
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self._route(method, path, body)
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                data = json.dumps(payload).encode()
+                writer.write(f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _serve(server, host, port, unix_path):
+    await server.start(host, port, unix_path)
+    where = [f"http://{host}:{port}"] if port is not None else []
+    if unix_path is not None:
+        where.append(f"unix:{unix_path}")
+    print(f"Serving on {' and '.join(where)} with {server.workers} workers", file=sys.stderr, flush=True)
+    serving = asyncio.ensure_future(server.serve_forever())
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, serving.cancel)
+    except NotImplementedError:
+        pass  # no signal handlers on Windows
+    try:
+        await serving
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve Connect 4 move analysis over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port (0 for none with --unix)")
+    parser.add_argument("--unix", help="also listen on this Unix socket")
+    parser.add_argument("--workers", type=int, default=None, help="engine worker processes (default: all cores)")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="most requests per worker batch")
+    parser.add_argument("--batch-window-ms", type=float, default=0.0,
+                        help="wait this long for more requests before sending a lone request to a worker")
+    parser.add_argument("--time-budget-ms", type=float, default=DEFAULT_TIME_BUDGET_MS,
+                        help="thinking time for requests that do not give one")
+    parser.add_argument("--max-time-budget-ms", type=float, default=MAX_TIME_BUDGET_MS,
+                        help="largest time budget a request may ask for")
+    parser.add_argument("--geometry", help="board variant as COLUMNSxROWS or COLUMNSxROWSxCONNECT, e.g. 9x7x5")
+    parser.add_argument("--book", default=BOOK_PATH, help="opening book file, used if it exists")
+    args = parser.parse_args()
+    if args.geometry:
+        try:
+            engine.configure(parse_geometry(args.geometry))
+        except ValueError as error:
+            parser.error(str(error))
+
+    analysis_server = AnalysisServer(args.workers, args.max_batch, args.batch_window_ms, args.time_budget_ms,
+                                     args.max_time_budget_ms, args.book)
+    try:
+        asyncio.run(_serve(analysis_server, args.host, args.port or None, args.unix))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,301 @@
+# Connect 4 self-play tournament
+# Plays engine-vs-engine games between search configurations (minimax, alpha-beta at
+# a fixed depth or with a time budget, pick_best_move) in a round robin across a
+# process pool, without a display. Every opening is a few seeded random moves and is
+# played twice with the colors swapped. Prints win/draw/loss tables, Elo estimates and
+# the average nodes and time per move, and can stream one JSON record per game or
+# append the games to a compact game record file (see game_record.py).
+#
+#     python tournament.py minimax:4 alpha_beta:6 alpha_beta:200ms pick_best_move --games 100
+#     python tournament.py alpha_beta:4 alpha_beta:6 --games 1000 --records games.jsonl
+#     python tournament.py alpha_beta:4 alpha_beta:6 --games 1000 --games-file games.c4g
+
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import engine
+from game_record import GameWriter, RESULT_DRAW
+from engine import (ROW_COUNT, COLUMN_COUNT, PLAYER_PIECE, AI_PIECE, create_board, drop_piece, get_next_open_row,
+                    get_valid_locations, winning_move, is_terminal_node, minimax, alpha_beta_ab, iterative_deepening,
+                    pick_best_move, TranspositionTable, MoveOrdering)
+
+ALGORITHMS = ("minimax", "alpha_beta", "pick_best_move")
+
+# Table size per player per game; every game starts with empty tables so results do
+# not depend on which worker process played it
+TABLE_SIZE_MB = 4
+
+
+# Parse a player spec: "minimax:4" and "alpha_beta:6" search to a fixed depth,
+# "alpha_beta:200ms" uses iterative deepening with that time budget per move, and
+# "pick_best_move" looks one move ahead. Returns (algorithm, depth, time_budget_ms).
+def parse_player(spec):
+    algorithm, _, limit = spec.partition(":")
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"unknown algorithm {algorithm!r} in {spec!r}, expected one of {', '.join(ALGORITHMS)}")
+    if algorithm == "pick_best_move":
+        if limit:
+            raise ValueError(f"pick_best_move takes no depth or time budget: {spec!r}")
+        return algorithm, None, None
+    if limit.endswith("ms") and algorithm == "alpha_beta":
+        return algorithm, None, float(limit[:-2])
+    if not limit.isdigit() or int(limit) < 1:
+        raise ValueError(f"expected a depth (or a time budget like 200ms for alpha_beta) in {spec!r}")
+    return algorithm, int(limit), None
+
+
+# Choose a move for piece with one player's configuration. Returns (column, nodes).
+def choose_move(player, board, piece, table, ordering):
+    algorithm, depth, time_budget_ms = player
+    maximizingPlayer = piece == AI_PIECE
+    if algorithm == "pick_best_move":
+        return pick_best_move(board, piece), len(get_valid_locations(board))
+    if algorithm == "minimax":
+        column, _, nodes, _ = minimax(board, depth, maximizingPlayer)
+    elif time_budget_ms is not None:
+        column, _, nodes, _, _ = iterative_deepening(board, time_budget_ms, maximizingPlayer, table, ordering=ordering)
+    else:
+        column, _, nodes, _ = alpha_beta_ab(board, depth, -math.inf, math.inf, maximizingPlayer, table, None, None,
+                                            ordering)
+    if column is None:
+        column = random.choice(get_valid_locations(board))
+    return column, nodes
+
+
+# Play one game; runs in the worker processes. The first player moves first with
+# PLAYER_PIECE after the opening moves. Returns the game record.
+def play_game(task):
+    game, first, second, opening_plies, seed = task
+    rng = random.Random(seed)
+    random.seed(seed)  # ties inside the searches are broken with random.choice
+    engine.opening_book = None
+    start_time = time.time()
+    board = create_board()
+    players = ((first, parse_player(first), PLAYER_PIECE), (second, parse_player(second), AI_PIECE))
+    tables = [TranspositionTable(TABLE_SIZE_MB), TranspositionTable(TABLE_SIZE_MB)]
+    orderings = [MoveOrdering(), MoveOrdering()]
+
+    moves = []
+    for _ in range(opening_plies):
+        col = rng.choice(get_valid_locations(board))
+        drop_piece(board, get_next_open_row(board, col), col, players[len(moves) % 2][2])
+        moves.append(col)
+        if is_terminal_node(board):
+            break
+
+    nodes = []
+    times = []
+    while not is_terminal_node(board):
+        turn = len(moves) % 2
+        _, player, piece = players[turn]
+        move_start = time.perf_counter()
+        col, explored = choose_move(player, board, piece, tables[turn], orderings[turn])
+        times.append((time.perf_counter() - move_start) * 1000)
+        nodes.append(explored)
+        drop_piece(board, get_next_open_row(board, col), col, piece)
+        moves.append(col)
+
+    if winning_move(board, PLAYER_PIECE):
+        winner = first
+    elif winning_move(board, AI_PIECE):
+        winner = second
+    else:
+        winner = None
+    return {"game": game, "first": first, "second": second, "opening": moves[:opening_plies], "moves": moves,
+            "winner": winner, "nodes": nodes, "time_ms": times, "seed": seed,
+            "duration_ms": (time.time() - start_time) * 1000}
+
+
+# The games of a round robin: every pair of players plays games_per_pair games, each
+# seeded opening twice with the colors swapped
+def schedule(players, games_per_pair, opening_plies, seed):
+    game = 0
+    for i, first in enumerate(players):
+        for second in players[i + 1:]:
+            for opening in range((games_per_pair + 1) // 2):
+                opening_seed = f"{seed}-{first}-{second}-{opening}"
+                for pair in ((first, second), (second, first))[:games_per_pair - 2 * opening]:
+                    yield game, pair[0], pair[1], opening_plies, opening_seed
+                    game += 1
+
+
+# Play a round robin and yield game records as they finish (not in schedule order)
+def play_tournament(players, games_per_pair=100, opening_plies=2, seed=1, workers=None):
+    for player in players:
+        parse_player(player)
+    if len(set(players)) != len(players):
+        raise ValueError("every player spec must be different")
+    tasks = schedule(players, games_per_pair, opening_plies, seed)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for task in tasks:
+            yield play_game(task)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(play_game, task) for task in tasks]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+# A tournament record in the game record format. The opening moves were not searched
+# and get no nodes or time.
+def to_game_record(record):
+    opening_plies = len(record["opening"])
+    if record["winner"] is None:
+        result = RESULT_DRAW if len(record["moves"]) == ROW_COUNT * COLUMN_COUNT else 0
+    else:
+        result = PLAYER_PIECE if record["winner"] == record["first"] else AI_PIECE
+    return {"first_piece": PLAYER_PIECE, "result": result,
+            "players": [parse_player(record["first"]), parse_player(record["second"])],
+            "opening_plies": opening_plies, "moves": record["moves"],
+            "nodes": [0] * opening_plies + record["nodes"], "time_ms": [0.0] * opening_plies + record["time_ms"]}
+
+
+# Elo ratings from the game results: a Bradley-Terry fit by minorization-maximization,
+# with one virtual draw per pairing so unbeaten players get a finite rating. Ratings
+# are relative, centered on 0.
+def elo_ratings(players, scores, games):
+    strength = {player: 1.0 for player in players}
+    for _ in range(1000):
+        updated = {}
+        for player in players:
+            total = 0.0
+            denominator = 0.0
+            for opponent in players:
+                played = games.get((player, opponent), 0)
+                if opponent == player or not played:
+                    continue
+                total += scores.get((player, opponent), 0.0) + 0.5
+                denominator += (played + 1) / (strength[player] + strength[opponent])
+            updated[player] = total / denominator if denominator else 1.0
+        mean = math.exp(sum(math.log(value) for value in updated.values()) / len(updated))
+        converged = all(abs(updated[p] / mean - strength[p]) < 1e-9 * strength[p] for p in players)
+        strength = {player: value / mean for player, value in updated.items()}
+        if converged:
+            break
+    return {player: 400 * math.log10(strength[player]) for player in players}
+
+
+# Running totals of a tournament: per-pairing win/draw/loss counts and per-player move
+# costs. Records are added one at a time so a long tournament never has to keep them.
+class Standings:
+    def __init__(self, players):
+        self.players = list(players)
+        self.results = {}  # (player, opponent) -> [wins, draws, losses]
+        self.costs = {player: {"moves": 0, "nodes": 0, "time_ms": 0.0} for player in self.players}
+
+    def add(self, record):
+        for turn, player in enumerate((record["first"], record["second"])):
+            opponent = record["second"] if turn == 0 else record["first"]
+            result = self.results.setdefault((player, opponent), [0, 0, 0])
+            if record["winner"] is None:
+                result[1] += 1
+            elif record["winner"] == player:
+                result[0] += 1
+            else:
+                result[2] += 1
+            # The searched moves start after the opening, which may have an odd length
+            first_search = (turn - len(record["opening"])) % 2
+            cost = self.costs[player]
+            cost["moves"] += len(record["nodes"][first_search::2])
+            cost["nodes"] += sum(record["nodes"][first_search::2])
+            cost["time_ms"] += sum(record["time_ms"][first_search::2])
+
+    # Win/draw/loss tables, Elo estimates and average cost per move
+    def summary(self):
+        scores = {pair: wins + draws / 2 for pair, (wins, draws, _) in self.results.items()}
+        games = {pair: sum(result) for pair, result in self.results.items()}
+        ratings = elo_ratings(self.players, scores, games)
+        players = {}
+        for player in self.players:
+            played = sum(games.get((player, opponent), 0) for opponent in self.players)
+            score = sum(scores.get((player, opponent), 0.0) for opponent in self.players)
+            cost = self.costs[player]
+            players[player] = {"elo": ratings[player], "games": played, "score": score / played if played else None,
+                               "nodes_per_move": cost["nodes"] / cost["moves"] if cost["moves"] else None,
+                               "ms_per_move": cost["time_ms"] / cost["moves"] if cost["moves"] else None}
+        return {"pairings": {f"{a} vs {b}": {"wins": w, "draws": d, "losses": l}
+                             for (a, b), (w, d, l) in self.results.items()},
+                "players": players}
+
+
+def print_summary(players, summary):
+    width = max(len(player) for player in players) + 2
+    print("Wins/draws/losses of the row player against the column player")
+    print(" " * width + "".join(f"{player:>{width}}" for player in players))
+    for player in players:
+        cells = []
+        for opponent in players:
+            result = summary["pairings"].get(f"{player} vs {opponent}")
+            cells.append(f"{'-' if result is None else '{wins}/{draws}/{losses}'.format(**result):>{width}}")
+        print(f"{player:<{width}}" + "".join(cells))
+    print()
+    print(f"{'player':<{width}} {'elo':>7} {'games':>6} {'score':>6} {'nodes/move':>11} {'ms/move':>9}")
+    ranked = sorted(players, key=lambda player: -summary["players"][player]["elo"])
+    for player in ranked:
+        s = summary["players"][player]
+        score = f"{s['score']:.3f}" if s["score"] is not None else "-"
+        nodes = f"{s['nodes_per_move']:.0f}" if s["nodes_per_move"] is not None else "-"
+        ms = f"{s['ms_per_move']:.2f}" if s["ms_per_move"] is not None else "-"
+        print(f"{player:<{width}} {s['elo']:>+7.0f} {s['games']:>6} {score:>6} {nodes:>11} {ms:>9}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Play a Connect 4 engine tournament.")
+    parser.add_argument("players", nargs="+",
+                        help="player specs: minimax:DEPTH, alpha_beta:DEPTH, alpha_beta:MSms or pick_best_move")
+    parser.add_argument("--games", type=int, default=100, help="games per pair of players")
+    parser.add_argument("--opening-plies", type=int, default=2, help="random moves at the start of every game")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the openings and tie breaks")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--records", help="append one JSON record per game to this file ('-' for stdout)")
+    parser.add_argument("--games-file", help="append every game to this game record file")
+    parser.add_argument("--output", help="write the summary as JSON to this file")
+    args = parser.parse_args()
+    if len(args.players) < 2:
+        parser.error("need at least two players")
+    try:
+        for spec in args.players:
+            parse_player(spec)
+    except ValueError as error:
+        parser.error(str(error))
+
+    records_file = None
+    if args.records == "-":
+        records_file = sys.stdout
+    elif args.records:
+        records_file = open(args.records, "a")
+    games_writer = GameWriter(args.games_file) if args.games_file else None
+    start_time = time.time()
+    standings = Standings(args.players)
+    played = 0
+    total = len(list(schedule(args.players, args.games, args.opening_plies, args.seed)))
+    try:
+        for record in play_tournament(args.players, args.games, args.opening_plies, args.seed, args.workers):
+            standings.add(record)
+            played += 1
+            if records_file is not None:
+                records_file.write(json.dumps(record) + "\n")
+                records_file.flush()
+            if games_writer is not None:
+                games_writer.write(to_game_record(record))
+            print(f"\r{played}/{total} games", end="", file=sys.stderr, flush=True)
+    finally:
+        if records_file is not None and records_file is not sys.stdout:
+            records_file.close()
+        if games_writer is not None:
+            games_writer.close()
+    print(f"\r{played} games in {time.time() - start_time:.1f} s", file=sys.stderr)
+
+    summary = standings.summary()
+    print_summary(args.players, summary)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(summary, output, indent=2)